@@ -0,0 +1,15 @@
+"""
+Benchmarks
+==========
+
+Render synthetic view trees against a fake API handler, and report the
+throughput, latency, threads and memory of `view.render_main_view` and of the
+`/view/` endpoint.
+
+```
+python -m benchmarks.render --requests 200 --concurrency 8 \\
+    --latency lognormal:20:0.5 --output results.json
+```
+
+See `benchmarks.render`.
+"""
@@ -0,0 +1,82 @@
+"""
+Memory Benchmark
+================
+
+Measure the memory and the time taken by the view nodes: a tree of `--nodes`
+rows (a list view with a child per row, like a large table) is created and
+the memory allocated is traced.
+
+```
+python -m benchmarks.memory --nodes 10000
+```
+
+The result is printed as json: the bytes allocated per node, and the
+microseconds taken to create and to contain (wrap in its element) a node.
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from lemon import view
+
+
+def create(nodes):
+    """Create a list view and its rows.
+
+    Args:
+        nodes (int): The number of rows.
+    Return:
+        `view.View`: The list view.
+    """
+
+    parent = view.View('Table')
+    for index in range(nodes):
+        row = view.View('Table/Row')
+        row.describe('tr', classes=['row'], attrs={'data-index': index})
+        parent.add_child(row)
+    return parent
+
+
+def measure(nodes=10000):
+    """Measure the view nodes.
+
+    Args:
+        nodes (int): The number of nodes.
+    Return:
+        dict: The results.
+    """
+
+    create(100)
+    start = time.perf_counter()
+    parent = create(nodes)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    traced = create(nodes)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del traced
+
+    start = time.perf_counter()
+    for row in parent.children:
+        row.contain('<td>%s</td>' % row.element_id)
+    contained = time.perf_counter() - start
+
+    return dict(
+        nodes=nodes,
+        bytes_per_node=round(size / nodes, 1),
+        create_us=round(elapsed / nodes * 1e6, 3),
+        contain_us=round(contained / nodes * 1e6, 3))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--nodes', type=int, default=10000)
+    args = parser.parse_args(argv)
+    print(json.dumps(measure(args.nodes), indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
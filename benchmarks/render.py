@@ -0,0 +1,358 @@
+"""
+Render Benchmark
+================
+
+Each scenario renders a synthetic view tree (generated in a temporary
+directory, see `generate`):
+
+- `deep`: a chain of nested views.
+- `wide`: a view with many children.
+- `large`: a view with a large template.
+- `fetching`: a view with many children fetching data.
+
+The data is provided by `FakeApiHandler`, which sleeps for a duration drawn
+from a latency distribution:
+
+- `constant:MS`
+- `uniform:MIN_MS:MAX_MS`
+- `lognormal:MEDIAN_MS:SIGMA`
+
+The results are printed (or written to `--output`) as json: for each scenario
+and each target, the throughput (requests per second), the p50 and p99 latency
+(milliseconds), the peak number of threads and the peak rss (kilobytes, for
+the whole process.) The `--seed` makes the latencies reproducible.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask
+
+from lemon import Lemon
+from lemon import view
+
+
+APP_VIEW = '{{ primary_view|safe }}\n'
+
+VIEWS = {
+    'Node': (
+        "{{ describe('section') }}\n"
+        "<h2>Level {{ params.depth }}</h2>\n"
+        "{% if params.depth %}"
+        "{{ view('Node', params={'depth': params.depth - 1}) }}"
+        "{% endif %}\n"),
+    'List': (
+        "{{ describe('ul') }}\n"
+        "{% for index in range(params.size) %}"
+        "{{ view('Item', params={'index': index}) }}"
+        "{% endfor %}\n"),
+    'Item': (
+        "{{ describe('li', classes=['item'], attrs={'data-index': "
+        "params.index}) }}\n"
+        "Item {{ params.index }}\n"),
+    'Feed': (
+        "{{ describe('ul') }}\n"
+        "{% for index in range(params.size) %}"
+        "{{ view('Entry', fetch={'endpoint': '/entries/', "
+        "'params': {'index': index}}) }}"
+        "{% endfor %}\n"),
+    'Entry': (
+        "{{ describe('li') }}\n"
+        "<a href=\"{{ data.url }}\">{{ data.title }}</a>\n"),
+}
+
+SCENARIOS = {
+    'deep': ('Node', lambda size: dict(depth=size)),
+    'wide': ('List', lambda size: dict(size=size)),
+    'large': ('Large', lambda size: dict()),
+    'fetching': ('Feed', lambda size: dict(size=size)),
+}
+
+
+def generate(directory, size):
+    """Generate the views of the scenarios.
+
+    Args:
+        directory (string): The directory of the views.
+        size (int): The size of the large template (number of blocks.)
+    """
+
+    views = dict(VIEWS, AppView=APP_VIEW, Large=''.join(
+        '<div class="block-%(index)d">'
+        '{%% for row in range(10) %%}<p>{{ row }} of %(index)d</p>'
+        '{%% endfor %%}</div>\n' % dict(index=index)
+        for index in range(size)))
+
+    for name, source in views.items():
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+        path = os.path.join(directory, name, '%s.nunjucks' % name)
+        with open(path, 'w') as f:
+            f.write(source)
+
+
+def latency(description, seed=None):
+    """Create a latency distribution.
+
+    Args:
+        description (string): The distribution (e.g. `uniform:5:50`.)
+        seed (int): The seed of the random generator.
+    Return:
+        Function: Returns a latency, in seconds.
+    """
+
+    name, *args = description.split(':')
+    args = [float(arg) for arg in args]
+    generator = random.Random(seed)
+    lock = threading.Lock()
+
+    distributions = {
+        'constant': lambda: args[0],
+        'uniform': lambda: generator.uniform(args[0], args[1]),
+        'lognormal': lambda: generator.lognormvariate(
+            math.log(args[0]), args[1]),
+    }
+
+    if name not in distributions:
+        raise ValueError('Unknown latency distribution: %s' % name)
+
+    def sample():
+        with lock:
+            return distributions[name]() / 1000
+    return sample
+
+
+class FakeApiHandler():
+
+    def __init__(self, latency):
+        """Initialize the fake api handler.
+
+        Args:
+            latency (Function): Returns the latency of a call, in seconds.
+        """
+
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get(self, context, view_name=None, endpoint=None, params=None):
+        """Wait for the latency, then return an entry.
+        """
+
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.latency())
+        index = (params or {}).get('index', 0)
+        return dict(
+            url='%s%s/' % (endpoint, index),
+            title='Entry %s' % index)
+
+
+class Monitor():
+
+    def __init__(self, interval=0.005):
+        """Initialize the monitor of the threads and memory.
+
+        Args:
+            interval (float): Number of seconds between two samples.
+        """
+
+        self.interval = interval
+        self.threads = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.threads = max(self.threads, threading.active_count())
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stopped.set()
+        self.thread.join()
+
+    @staticmethod
+    def rss():
+        """Peak rss of the process, in kilobytes.
+        """
+
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes.
+        return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def percentile(values, rank):
+    """Get a percentile (nearest rank.)
+
+    Args:
+        values (list): The sorted values.
+        rank (float): The percentile (e.g. 99.)
+    Return:
+        float: The value.
+    """
+
+    if not values:
+        return 0
+    index = max(0, math.ceil(len(values) * rank / 100) - 1)
+    return values[index]
+
+
+def create_app(directory, api_handler, config=None):
+    """Create the benchmarked application.
+
+    Args:
+        directory (string): The directory of the views.
+        api_handler: The api handler.
+        config (dict): Additional configuration.
+    Return:
+        `Lemon`: The lemon instance.
+    """
+
+    app = Flask(__name__)
+    app.config.update(config or {})
+    return Lemon(
+        app, app_view='AppView', view_path=directory + '/',
+        api_handler=api_handler)
+
+
+def run(lemon, target, primary_view, params, requests, concurrency):
+    """Render a view repeatedly.
+
+    Args:
+        lemon (Lemon): The lemon instance.
+        target (string): `render_main_view` or `view_handler`.
+        primary_view (string): The view rendered.
+        params (dict): The params of the view.
+        requests (int): The number of renders.
+        concurrency (int): The number of renders at the same time.
+    Return:
+        dict: The results.
+    """
+
+    app = lemon.app
+    client = app.test_client()
+    data = json.dumps(dict(path=primary_view, params=params))
+
+    def render():
+        start = time.perf_counter()
+        if target == 'view_handler':
+            response = client.get('/view/', query_string=dict(data=data))
+            assert response.status_code == 200
+        else:
+            with app.test_request_context('/'):
+                view.render_main_view(lemon, primary_view, params=params)
+        return time.perf_counter() - start
+
+    render()
+    with Monitor() as monitor:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            durations = sorted(executor.map(
+                lambda _: render(), range(requests)))
+        elapsed = time.perf_counter() - start
+
+    return dict(
+        requests=requests,
+        concurrency=concurrency,
+        throughput=round(requests / elapsed, 2),
+        p50=round(percentile(durations, 50) * 1000, 3),
+        p99=round(percentile(durations, 99) * 1000, 3),
+        peak_threads=monitor.threads,
+        peak_rss=Monitor.rss())
+
+
+def benchmark(scenarios=None, targets=None, size=50, requests=100,
+              concurrency=4, distribution='constant:5', seed=0,
+              config=None):
+    """Run the benchmarks.
+
+    Args:
+        scenarios (list): The scenarios (default: all of them.)
+        targets (list): `render_main_view` and/or `view_handler`.
+        size (int): The size of the trees (depth, width, blocks.)
+        requests (int): The number of renders per scenario and target.
+        concurrency (int): The number of renders at the same time.
+        distribution (string): The latency of the api handler.
+        seed (int): The seed of the latencies.
+        config (dict): Additional configuration of the application.
+    Return:
+        dict: The parameters and the results.
+    """
+
+    scenarios = scenarios or sorted(SCENARIOS)
+    targets = targets or ['render_main_view', 'view_handler']
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        generate(directory, size)
+        api_handler = FakeApiHandler(latency(distribution, seed))
+        lemon = create_app(directory, api_handler, config)
+        try:
+            for name in scenarios:
+                primary_view, params = SCENARIOS[name]
+                for target in targets:
+                    results['%s.%s' % (name, target)] = run(
+                        lemon, target, primary_view, params(size),
+                        requests, concurrency)
+        finally:
+            lemon.shutdown()
+
+    return dict(
+        python=sys.version.split()[0],
+        size=size,
+        latency=distribution,
+        seed=seed,
+        config=config or {},
+        results=results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument(
+        '--scenario', action='append', choices=sorted(SCENARIOS))
+    parser.add_argument(
+        '--target', action='append',
+        choices=['render_main_view', 'view_handler'])
+    parser.add_argument('--size', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', default='constant:5')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--config', action='append', default=[], metavar='KEY=JSON',
+        help='Application configuration (e.g. LEMON_ASYNC=true)')
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    config = {}
+    for option in args.config:
+        key, value = option.split('=', 1)
+        config[key] = json.loads(value)
+
+    report = benchmark(
+        scenarios=args.scenario, targets=args.target, size=args.size,
+        requests=args.requests, concurrency=args.concurrency,
+        distribution=args.latency, seed=args.seed, config=config)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
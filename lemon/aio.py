@@ -0,0 +1,49 @@
+"""
+Asyncio
+=======
+
+Views can be rendered on an event loop (see `View.render_async`): all the
+fetches of a page are coroutines instead of threads. Asgi servers await the
+coroutines directly, wsgi servers go through this bridge which keeps one event
+loop per worker thread.
+
+Configuration
+-------------
+
+- `LEMON_ASYNC`: Render the routes and the partial views with asyncio
+  (default: False).
+"""
+
+import asyncio
+import threading
+
+
+_local = threading.local()
+
+
+def get_loop():
+    """Get the event loop of the current worker thread.
+
+    Return:
+        `asyncio.AbstractEventLoop`: The event loop (created on first use.)
+    """
+
+    loop = getattr(_local, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _local.loop = loop
+    return loop
+
+
+def run(coroutine):
+    """Run a coroutine from synchronous code.
+
+    Args:
+        coroutine: The coroutine to run.
+    Return:
+        The result of the coroutine.
+    """
+
+    loop = get_loop()
+    asyncio.set_event_loop(loop)
+    return loop.run_until_complete(coroutine)
@@ -1,5 +1,239 @@
+"""
+API
+===
+
+The data of the views is provided by the api handler of the lemon instance
+(`Lemon(api_handler=...)`.) Any object with a `get(context, view_name,
+endpoint, params)` method can be used. `ApiHandler` fetches a json api over
+http:
+
+```python
+lemon = Lemon(app, api_handler=api.ApiHandler(
+    'http://localhost:8000/api/', pool_size=32, max_per_host=16,
+    timeout=2))
+```
+
+The connections are kept alive and shared by all the views (a pool per
+host), and the number of requests sent at the same time to the same host can
+be capped. Responses are requested gzipped.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+import urllib.parse
+
 import requests
-import urllib
+import requests.adapters
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class ApiHandler():
+
+    def __init__(self, base_url='', pool_size=10, hosts=10,
+                 max_per_host=None, timeout=None, headers=None):
+        """Initialize the http api handler.
+
+        Args:
+            base_url (string): The url the endpoints are relative to.
+            pool_size (int): The number of connections kept alive per host.
+            hosts (int): The number of hosts with a pool of connections.
+            max_per_host (int): The number of requests sent at the same time
+                to a host (default: no limit.)
+            timeout (float): Number of seconds to wait for the api.
+            headers (dict): Headers sent with every request.
+        """
+
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.semaphores = {}
+        self.executor = None
+        self.lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate'})
+        self.session.headers.update(headers or {})
+
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=hosts, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, context, view_name=None, endpoint=None, params=None):
+        """Fetch an endpoint.
+
+        Args:
+            context (dict): The context of the request.
+            view_name (string): The name of the view.
+            endpoint (string): The endpoint (relative to the base url.)
+            params (dict): The query params.
+        Return:
+            The decoded json response.
+        """
+
+        return self.request(context, endpoint, params, self.timeout)
+
+    def get_within(self, context, timeout, view_name=None, endpoint=None,
+                   params=None):
+        """Fetch an endpoint within the deadline of a view (see
+        `LEMON_RENDER_DEADLINE`.)
+
+        Args:
+            context (dict): The context of the request.
+            timeout (float): Number of seconds left (capped by the timeout
+                of the handler.)
+            view_name (string): The name of the view.
+            endpoint (string): The endpoint (relative to the base url.)
+            params (dict): The query params.
+        Return:
+            The decoded json response.
+        Raise:
+            `TimeoutError`: The api did not answer in time.
+        """
+
+        if self.timeout:
+            timeout = min(timeout, self.timeout)
+
+        try:
+            return self.request(context, endpoint, params, timeout)
+        except requests.Timeout as error:
+            raise TimeoutError(str(error)) from error
+
+    def request(self, context, endpoint, params, timeout):
+        """Send a request to the api.
+
+        Args:
+            context (dict): The context of the request.
+            endpoint (string): The endpoint (relative to the base url.)
+            params (dict): The query params.
+            timeout (float): Number of seconds to wait for the api.
+        Return:
+            The decoded json response.
+        """
+
+        url = self.url(endpoint)
+        with self.semaphore(urllib.parse.urlsplit(url).netloc):
+            response = self.session.get(
+                url, params=params, headers=self.headers(context),
+                timeout=timeout)
+        response.raise_for_status()
+        return self.decode(response)
+
+    def get_many(self, context, requests):
+        """Fetch several endpoints at the same time (see `LEMON_FETCH_BATCH`.)
+
+        Args:
+            context (dict): The context of the request.
+            requests (list): The `view_name`, `endpoint` and `params` of each
+                request.
+        Return:
+            list: The response of each request.
+        """
+
+        with self.lock:
+            if not self.executor:
+                self.executor = ThreadPoolExecutor(self.pool_size)
+
+        futures = [
+            self.executor.submit(self.get, context, **request)
+            for request in requests]
+        return [future.result() for future in futures]
+
+    def headers(self, context):
+        """Headers of a request, override to add the headers depending on the
+        context (e.g. authentication.)
+
+        Args:
+            context (dict): The context of the request.
+        Return:
+            dict: The headers.
+        """
+
+        return None
+
+    def url(self, endpoint):
+        """Get the url of an endpoint.
+
+        Args:
+            endpoint (string): The endpoint (absolute urls are kept.)
+        Return:
+            string: The url.
+        """
+
+        endpoint = endpoint or ''
+        if urllib.parse.urlsplit(endpoint).scheme:
+            return endpoint
+        return '%s/%s' % (self.base_url.rstrip('/'), endpoint.lstrip('/'))
+
+    def semaphore(self, host):
+        """Get the semaphore limiting the requests to a host.
+
+        Args:
+            host (string): The host (and port.)
+        Return:
+            `threading.BoundedSemaphore`: The semaphore, or a lock that does
+                not limit anything if there is no limit.
+        """
+
+        if not self.max_per_host:
+            return NO_LIMIT
+
+        with self.lock:
+            semaphore = self.semaphores.get(host)
+            if not semaphore:
+                semaphore = threading.BoundedSemaphore(self.max_per_host)
+                self.semaphores[host] = semaphore
+        return semaphore
+
+    def decode(self, response):
+        """Decode a json response.
+
+        The body is decoded from the bytes received, without building a
+        string first.
+
+        Args:
+            response (`requests.Response`): The response.
+        Return:
+            The value.
+        """
+
+        content = response.content
+        if not content:
+            return None
+        if orjson:
+            return orjson.loads(content)
+        return json.loads(content)
+
+    def close(self):
+        """Close the connections.
+        """
+
+        self.session.close()
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+class NoLimit():
+    """Semaphore of the hosts without limit.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+NO_LIMIT = NoLimit()
 
 
 def jinja2(endpoint, params=None):
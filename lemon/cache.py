@@ -0,0 +1,276 @@
+"""
+Cache
+=====
+
+Responses of the API handler can be cached between requests. Caching is
+opt-in: an endpoint is only cached if its fetch declares a `ttl` (in seconds),
+or if `LEMON_API_CACHE_TTL` sets a default.
+
+```python
+route.add('/artists/', 'Artists', fetch={
+    'endpoint': '/artists/',
+    'ttl': 30})
+```
+
+The cache is shared by all the users: when the response depends on the
+context (e.g. the current user), list the context keys in `vary`.
+
+Backends
+--------
+
+By default, responses are kept in memory (`LRUCache`). Any object providing
+`get(key)` (returns `None` when missing) and `set(key, value, ttl)` can be
+passed as `api_cache` to `Lemon` to use an external store.
+
+Configuration
+-------------
+
+- `LEMON_API_CACHE_SIZE`: Number of responses kept in memory (default: 1024).
+- `LEMON_API_CACHE_TTL`: Default ttl of the endpoints (default: 0, no cache.)
+
+Fragments
+---------
+
+The html of a view can also be cached, for views producing the same html for
+the same path, params and data. A view declares it in its template, with the
+context keys the html depends on:
+
+```
+{{ describe('nav', cache=60, vary=['user']) }}
+```
+
+or when included: `{{ view('Footer', cache=300) }}` (and with the `cache`
+route option for the primary view.) `Lemon.invalidate_view` removes all the
+fragments of a view.
+
+- `LEMON_FRAGMENT_CACHE_SIZE`: Number of fragments kept in memory (default:
+  512).
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+import time
+
+
+class LRUCache():
+
+    def __init__(self, size=1024):
+        """Initialize the in-memory cache.
+
+        Args:
+            size (int): The maximum number of entries.
+        """
+
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Get an entry.
+
+        Args:
+            key (string): The key of the entry.
+        Return:
+            The value, or `None` if the entry is missing or expired.
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry:
+                return None
+
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        """Set an entry.
+
+        The least recently used entries are evicted once the cache is full.
+
+        Args:
+            key (string): The key of the entry.
+            value: The value.
+            ttl (int): The number of seconds the entry is valid.
+        """
+
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        """Delete an entry.
+
+        Args:
+            key (string): The key of the entry.
+        """
+
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        """Delete all the entries.
+        """
+
+        with self.lock:
+            self.entries.clear()
+
+
+class Cache():
+
+    def __init__(self, backend):
+        """Initialize the cache.
+
+        Args:
+            backend: The store of the entries (see `LRUCache`.)
+        """
+
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Get an entry and count the hits and misses.
+
+        Args:
+            key (string): The key of the entry.
+        Return:
+            The value, or `None`.
+        """
+
+        value = self.backend.get(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl):
+        """Set an entry.
+
+        Args:
+            key (string): The key of the entry.
+            value: The value.
+            ttl (int): The number of seconds the entry is valid.
+        """
+
+        self.backend.set(key, value, ttl)
+
+    def stats(self):
+        """Statistics of the cache.
+
+        Return:
+            dict: The number of hits and misses.
+        """
+
+        return dict(hits=self.hits, misses=self.misses)
+
+
+class FragmentCache(Cache):
+
+    def __init__(self, backend):
+        """Initialize the cache of the view fragments.
+
+        Args:
+            backend: The store of the entries (see `LRUCache`.)
+        """
+
+        super().__init__(backend)
+        self.views = {}
+        self.generations = {}
+
+    def declare(self, path, ttl, vary=None):
+        """Declare a cacheable view.
+
+        Args:
+            path (string): The path of the view.
+            ttl (int): The number of seconds the fragments are valid.
+            vary (list): The context keys the fragments depend on.
+        """
+
+        self.views[path] = (ttl, vary)
+
+    def declaration(self, path):
+        """Get the declaration of a view.
+
+        Args:
+            path (string): The path of the view.
+        Return:
+            tuple: The ttl and the context keys, or `None` if the view is not
+                cacheable.
+        """
+
+        return self.views.get(path)
+
+    def key(self, path, params=None, data=None, vary=None):
+        """Create the key of a fragment.
+
+        Args:
+            path (string): The path of the view.
+            params (dict): The params of the view.
+            data: The data of the view.
+            vary (dict): The context values the fragment depends on.
+        Return:
+            string: The key.
+        """
+
+        value = json.dumps(
+            [path, params or {}, data, vary or {}],
+            sort_keys=True, separators=(',', ':'), default=str)
+        return 'fragment:' + hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+    def current(self, paths):
+        """Check if none of the views of a fragment have been invalidated.
+
+        Args:
+            paths (dict): The generation of each view of the fragment.
+        Return:
+            bool: If the fragment is still valid.
+        """
+
+        return all(
+            self.generations.get(path, 0) == generation
+            for path, generation in paths.items())
+
+    def invalidate(self, path):
+        """Invalidate all the fragments containing a view.
+
+        The fragments are not deleted: they are ignored once found (see
+        `current`) and are evicted from the backend over time.
+
+        Args:
+            path (string): The path of the view.
+        """
+
+        with self.lock:
+            self.generations[path] = self.generations.get(path, 0) + 1
+
+
+def key(endpoint, params=None, vary=None):
+    """Create the key of an endpoint.
+
+    The params are normalized: the order of the keys does not matter, and
+    missing params are the same as `None` params.
+
+    Args:
+        endpoint (string): The endpoint.
+        params (dict): The params of the endpoint.
+        vary (dict): Additional values the response depends on.
+    Return:
+        string: The key.
+    """
+
+    params = {k: v for k, v in (params or {}).items() if v is not None}
+    return json.dumps(
+        [endpoint, params, vary or {}], sort_keys=True,
+        separators=(',', ':'), default=str)
@@ -0,0 +1,127 @@
+"""
+Compression
+===========
+
+Responses with an etag (see `LEMON_ETAG` and `LEMON_VIEW_ETAG`) are
+compressed once: the etags are remembered, and from the second response with
+the same etag, the encoding preferred by the `Accept-Encoding` of the request
+is compressed (gzip, or brotli when
+[brotli](https://github.com/google/brotli) is installed) and stored with the
+etag. The next responses in that encoding send the stored bytes as is.
+
+Pages seen once (e.g. personalized pages, with a new etag on almost every
+request) are never compressed here, and only the encodings the clients ask
+for are produced.
+
+The stored body is the one of the first response compressed: it only differs
+from the current one by its element ids (see `scope.Scope.etag`), as when a
+client keeps its copy after a 304.
+
+Responses sent with a `Content-Encoding` are left alone by the compression
+middlewares (e.g. Flask-Compress.)
+
+Configuration
+-------------
+
+- `LEMON_COMPRESS`: Compress the responses with an etag (default: False.)
+- `LEMON_COMPRESS_CACHE_SIZE`: Number of etags (and their compressed
+  responses) kept in memory (default: 256.)
+- `LEMON_COMPRESS_MIN_SIZE`: Number of characters under which a response is
+  not compressed (default: 1024.)
+- `LEMON_COMPRESS_LEVEL`: Compression level of gzip, from 1 to 9 (default:
+  6.)
+- `LEMON_COMPRESS_BROTLI_QUALITY`: Quality of brotli, from 0 to 11 (default:
+  4, the highest qualities take hundreds of milliseconds on large pages.)
+"""
+
+import gzip
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+# Encodings produced, by order of preference.
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+# Number of seconds the encodings are kept: the etag identifies the content,
+# they are only evicted when the cache is full.
+TTL = 86400
+
+
+def encode(data, encoding, level=6, quality=4):
+    """Compress a body.
+
+    Args:
+        data (bytes): The body.
+        encoding (string): The encoding (`gzip` or `br`.)
+        level (int): The compression level of gzip.
+        quality (int): The quality of brotli.
+    Return:
+        bytes: The compressed body, or `None` if it is not smaller.
+    """
+
+    if encoding == 'br':
+        value = brotli.compress(
+            data, mode=brotli.MODE_TEXT, quality=quality)
+    else:
+        value = gzip.compress(data, compresslevel=level)
+    return value if len(value) < len(data) else None
+
+
+def negotiate(accept_encodings):
+    """Pick the encoding of a response.
+
+    Args:
+        accept_encodings (`werkzeug.datastructures.Accept`): The
+            `Accept-Encoding` of the request.
+    Return:
+        string: The encoding (`identity` if none is accepted.)
+    """
+
+    return accept_encodings.best_match(ENCODINGS) or 'identity'
+
+
+def lookup(lemon, body, etag, accept_encodings):
+    """Get the body of a response in the encoding accepted by the client.
+
+    Args:
+        lemon (Lemon): The lemon instance.
+        body (string): The body of the response.
+        etag (string): The etag of the body.
+        accept_encodings (`werkzeug.datastructures.Accept`): The
+            `Accept-Encoding` of the request.
+    Return:
+        tuple: The body (bytes) and its encoding, or `None` if the response
+            is not compressed.
+    """
+
+    if not lemon or lemon.compressed is None:
+        return None
+
+    encodings = lemon.compressed.get(etag)
+    if encodings is None:
+        config = lemon.app.config
+        if len(body) >= config.get('LEMON_COMPRESS_MIN_SIZE'):
+            # First sighting: compressed if the etag comes back.
+            lemon.compressed.set(etag, {}, TTL)
+        return None
+
+    if not encodings:
+        encodings = {'identity': body.encode('utf-8')}
+
+    encoding = negotiate(accept_encodings)
+    if encoding not in encodings:
+        config = lemon.app.config
+        encodings = dict(encodings)
+        encodings[encoding] = encode(
+            encodings['identity'], encoding,
+            config.get('LEMON_COMPRESS_LEVEL'),
+            config.get('LEMON_COMPRESS_BROTLI_QUALITY'))
+        lemon.compressed.set(etag, encodings, TTL)
+
+    data = encodings[encoding]
+    if data is None:
+        return encodings['identity'], 'identity'
+    return data, encoding
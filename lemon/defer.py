@@ -0,0 +1,97 @@
+"""
+Deferred Views
+==============
+
+Views that are not needed right away (e.g. below the fold) can be deferred:
+they are neither fetched nor rendered with the page. Only their container is
+sent, with the description of the view in a `data-lemon-lazy` attribute, and
+the client loads them later with the `/view/` endpoint.
+
+```
+{{ view('Comments', defer=True, fetch={'endpoint': '/comments/'}) }}
+```
+
+or with the `defer` option of a route (for the primary view.)
+
+The description includes a `token`: the description signed with the
+`SECRET_KEY` of the application. The client sends it back as is (`{"token":
+"..."}`) to render the view. With `LEMON_VIEW_SIGNED`, the `/view/` endpoint
+only renders the views described by a token: clients can not ask for other
+views, params or endpoints.
+
+Configuration
+-------------
+
+- `LEMON_VIEW_SIGNED`: Only render signed descriptions on the `/view/`
+  endpoint (default: False.)
+"""
+
+from flask import abort
+import itsdangerous
+
+
+SALT = 'lemon.view'
+
+
+def serializer(lemon):
+    """Get the serializer signing the descriptions.
+
+    Args:
+        lemon (Lemon): The lemon instance.
+    Return:
+        `itsdangerous.URLSafeSerializer`: The serializer, or `None` if the
+            application has no secret key.
+    """
+
+    secret_key = lemon.app.secret_key if lemon else None
+    if not secret_key:
+        return None
+    return itsdangerous.URLSafeSerializer(secret_key, salt=SALT)
+
+
+def sign(lemon, description):
+    """Sign the description of a view.
+
+    Args:
+        lemon (Lemon): The lemon instance.
+        description (dict): The path, params, fetch and id of the view.
+    Return:
+        string: The token, or `None` if the application has no secret key.
+    """
+
+    signer = serializer(lemon)
+    return signer.dumps(description) if signer else None
+
+
+def load(lemon, params):
+    """Load the description of a view sent to the `/view/` endpoint.
+
+    Descriptions with a `token` are replaced with the signed description
+    (a 400 is returned if the signature is invalid.) Descriptions without a
+    token are returned as is, unless `LEMON_VIEW_SIGNED` is set (403.)
+
+    Args:
+        lemon (Lemon): The lemon instance.
+        params (dict): The description sent.
+    Return:
+        dict: The description of the view.
+    """
+
+    token = params.get('token')
+    if not token:
+        if lemon.app.config.get('LEMON_VIEW_SIGNED'):
+            abort(403)
+        return params
+
+    signer = serializer(lemon)
+    if not signer:
+        abort(400)
+
+    try:
+        description = signer.loads(token)
+    except itsdangerous.BadSignature:
+        abort(400)
+
+    if params.get('fingerprints'):
+        description.update(fingerprints=params.get('fingerprints'))
+    return description
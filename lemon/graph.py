@@ -0,0 +1,254 @@
+"""
+Dependency Graph
+================
+
+The fetches of nested views run one level after the other: a child only
+starts fetching once the template of its parent runs, which is once the data
+of its parent has been fetched. With `LEMON_PREFETCH`, the templates of the
+views are analyzed when the application starts, and the fetches which are
+known before rendering are all started at the beginning of the request.
+
+A fetch is known when it only depends on literals and on the `params` of its
+view, e.g.:
+
+```
+{{ view('Chart', params={'id': params.id}, fetch=Api('/charts/', {
+    'id': params.id})) }}
+```
+
+Views included in a condition (`if`) or a loop (`for`) are left out: they
+might not be rendered. In templates assigning `params` (`set` or `with`),
+`params` is no longer the params of the view: only the fetches made of
+literals are known. The views rendered then find the data in flight (see
+`scope.Scope.single_flight`.)
+
+Configuration
+-------------
+
+- `LEMON_PREFETCH`: Analyze the views at startup and prefetch their data
+  (default: False.)
+"""
+
+from jinja2 import TemplateNotFound
+from jinja2 import nodes
+
+
+# Nodes whose content might not be rendered.
+CONDITIONAL_NODES = (
+    nodes.If, nodes.For, nodes.Macro, nodes.CallBlock, nodes.CondExpr)
+
+
+class Dynamic(Exception):
+    """The value of an expression is only known when rendering.
+    """
+
+
+class Dependency():
+
+    def __init__(self, path, params, fetch, shadowed=False):
+        """Initialize the dependency of a view on a child view.
+
+        Args:
+            path (string): The path of the child view.
+            params (`jinja2.nodes.Expr`): The params of the child.
+            fetch (`jinja2.nodes.Expr`): The fetch of the child.
+            shadowed (bool): If the template assigns `params` (see
+                `assigns`.)
+        """
+
+        self.path = path
+        self.params = params
+        self.fetch = fetch
+        self.shadowed = shadowed
+
+    def resolve(self, params):
+        """Get the params and the fetch of the child view.
+
+        Args:
+            params (dict): The params of the parent view.
+        Return:
+            tuple: The params (`None` if they are not known) and the fetch
+                (`None` if it is not known.)
+        """
+
+        if self.shadowed:
+            params = None
+
+        try:
+            child_params = evaluate(self.params, params) or {}
+        except Dynamic:
+            child_params = None
+
+        try:
+            fetch = evaluate(self.fetch, params)
+        except Dynamic:
+            fetch = None
+        return child_params, fetch if isinstance(fetch, dict) else None
+
+
+def evaluate(node, params):
+    """Evaluate an expression which only depends on literals and `params`.
+
+    Args:
+        node (`jinja2.nodes.Expr`): The expression.
+        params (dict): The params of the view (`None` if unknown.)
+    Return:
+        The value.
+    Raise:
+        `Dynamic`: The value depends on the rendering.
+    """
+
+    if node is None:
+        return None
+
+    if isinstance(node, nodes.Const):
+        return node.value
+
+    if isinstance(node, nodes.Dict):
+        return {
+            evaluate(pair.key, params): evaluate(pair.value, params)
+            for pair in node.items}
+
+    if isinstance(node, (nodes.List, nodes.Tuple)):
+        return [evaluate(item, params) for item in node.items]
+
+    if isinstance(node, nodes.Name) and node.name == 'params':
+        if params is None:
+            raise Dynamic()
+        return params
+
+    if isinstance(node, (nodes.Getattr, nodes.Getitem)):
+        value = evaluate(node.node, params)
+        key = (
+            node.attr if isinstance(node, nodes.Getattr)
+            else evaluate(node.arg, params))
+        if not isinstance(value, dict):
+            raise Dynamic()
+        return value.get(key)
+
+    if (isinstance(node, nodes.Call) and isinstance(node.node, nodes.Name) and
+            node.node.name == 'Api' and not node.kwargs):
+        args = [evaluate(arg, params) for arg in node.args]
+        return dict(zip(['endpoint', 'params'], args))
+
+    raise Dynamic()
+
+
+def assigns(node, name):
+    """Check if a template assigns a name (`set` or `with`.)
+
+    Args:
+        node (`jinja2.nodes.Node`): The template.
+        name (string): The name.
+    Return:
+        bool: If the name is assigned.
+    """
+
+    for assign in node.find_all((nodes.Assign, nodes.AssignBlock, nodes.With)):
+        targets = (
+            assign.targets if isinstance(assign, nodes.With)
+            else [assign.target])
+        for target in targets:
+            for found in [target] + list(target.find_all(nodes.Name)):
+                if isinstance(found, nodes.Name) and found.name == name:
+                    return True
+    return False
+
+
+def dependencies(node, shadowed=None):
+    """Find the views included by a template.
+
+    Args:
+        node (`jinja2.nodes.Node`): The template (or a node within it.)
+        shadowed (bool): If the template assigns `params` (default: checked
+            on the node.)
+    Return:
+        list: The `Dependency` of each view always included.
+    """
+
+    if shadowed is None:
+        shadowed = assigns(node, 'params')
+
+    found = []
+    for child in node.iter_child_nodes():
+        if isinstance(child, CONDITIONAL_NODES):
+            continue
+
+        if (isinstance(child, nodes.Call) and
+                isinstance(child.node, nodes.Name) and
+                child.node.name == 'view' and child.args and
+                isinstance(child.args[0], nodes.Const)):
+            kwargs = {keyword.key: keyword.value for keyword in child.kwargs}
+            if 'defer' not in kwargs:
+                found.append(Dependency(
+                    child.args[0].value, kwargs.get('params'),
+                    kwargs.get('fetch'), shadowed))
+
+        found.extend(dependencies(child, shadowed))
+    return found
+
+
+def analyze(env):
+    """Build the dependency graph of the views.
+
+    Args:
+        env (`jinja2.Environment`): The environment of the views.
+    Return:
+        dict: The dependencies of each view (by template.)
+    """
+
+    graph = {}
+    names = env.list_templates(
+        filter_func=lambda name: name.endswith('.nunjucks'))
+    for name in names:
+        source, _, _ = env.loader.get_source(env, name)
+        graph[name] = dependencies(env.parse(source))
+    return graph
+
+
+def update(graph, env, names):
+    """Update the dependencies of the templates which changed.
+
+    Args:
+        graph (dict): The dependency graph (see `analyze`.)
+        env (`jinja2.Environment`): The environment of the views.
+        names (list): The names of the templates.
+    """
+
+    for name in names:
+        try:
+            source, _, _ = env.loader.get_source(env, name)
+        except TemplateNotFound:
+            graph.pop(name, None)
+            continue
+        graph[name] = dependencies(env.parse(source))
+
+
+def prefetch(graph, path, params, template_path, limit=100):
+    """List the fetches of a view tree known before rendering.
+
+    Args:
+        graph (dict): The dependency graph (see `analyze`.)
+        path (string): The path of the view rendered.
+        params (dict): The params of the view.
+        template_path (Function): Gives the name and the template of a view
+            path.
+        limit (int): The maximum number of views visited.
+    Return:
+        list: The path and the fetch of each view.
+    """
+
+    fetches = []
+    pending = [(path, params)]
+    for _ in range(limit):
+        if not pending:
+            break
+
+        path, params = pending.pop()
+        _, template = template_path(path)
+        for dependency in graph.get(template, []):
+            child_params, child_fetch = dependency.resolve(params)
+            if child_fetch:
+                fetches.append((dependency.path, child_fetch))
+            pending.append((dependency.path, child_params))
+    return fetches
@@ -4,10 +4,44 @@ Handlers
 
 Handlers provide additional endpoints for all requests that do not correspond
 to an existing view.
+
+Partial views
+-------------
+
+The `/view/` endpoint renders the view described by the `data` query param
+(json object with the `path`, `params`, `fetch` and `id` of the view.)
+
+When `data` is a list of descriptions, all the views are rendered at the same
+time, with the same context, and the identical fetches are shared. The
+response contains an object for each `id` (or position in the list), with
+either the `html` and `tree` of the view or an `error`.
+
+Instead of a description, the client can send the `tree` of a view it has
+already rendered, and the `target` to re-render within it (see `target`.) The
+views of the subtree whose inputs did not change are not rendered again.
+
+Views can also be described by the signed `token` of a deferred view (see
+`lemon.defer`.)
+
+The response of a single view is streamed (unless it has an etag), see
+`lemon.serialize`.
+
+With `LEMON_SERVER_TIMING`, the tree of each view includes its `timings` (in
+milliseconds, see `lemon.timing`.)
 """
 
+from flask import abort
 from flask import current_app
 from flask import json
+import asyncio
+import time
+
+from lemon import aio
+from lemon import defer
+from lemon import route
+from lemon import scope
+from lemon import serialize
+from lemon import timing
 from lemon import view
 
 
@@ -32,17 +66,278 @@ def view_handler(request, options=None):
         abort(512)
 
     params = json.loads(request.args.get('data'))
+    if isinstance(params, list):
+        params = [defer.load(lemon, description) for description in params]
+    else:
+        params = defer.load(lemon, params)
+
+    request_scope = scope.Scope()
+    config = current_app.config
+    options = options or {}
+    if config.get('LEMON_SERVER_TIMING'):
+        request_scope.timings = timing.Timings()
+
+    deadline = options.get('deadline', config.get('LEMON_RENDER_DEADLINE'))
+    if deadline:
+        request_scope.deadline = time.monotonic() + deadline
+
+    if current_app.config.get('LEMON_ASYNC'):
+        response = aio.run(view_handler_async(lemon, params, request_scope))
+    elif isinstance(params, list):
+        response = render_partials(lemon, params, request_scope)
+    else:
+        # Streamed, unless the whole response is needed for the etag.
+        response = serialize.partial(
+            partial_view(lemon, params, request_scope))
+
+    etag = None
+    if options.get('etag', config.get('LEMON_VIEW_ETAG')):
+        response = ''.join(response)
+        etag = request_scope.etag(response)
+
+    return route.conditional(
+        response,
+        etag=etag,
+        cache_control=options.get(
+            'cache_control', config.get('LEMON_VIEW_CACHE_CONTROL')),
+        headers=route.scope_headers(request_scope),
+        mimetype='application/json')
+
+
+def target(params, request_scope):
+    """Get the description of the view to render.
+
+    When the params contain the `tree` of a view (see `View.to_dict`), the
+    view rendered is the node of the tree designated by `target`: either a
+    list of child indices, or the `id` or `element_id` of the node (the root
+    of the tree by default.) The fingerprints of the subtree are added to the
+    scope: the views that did not change are returned empty, with their
+    `unchanged` flag set (see `View.keep`.)
+
+    The fingerprints of the views the client has can also be sent directly,
+    with `fingerprints` (the fingerprint of each element id.)
+
+    Args:
+        params (dict): The params of the request.
+        request_scope (`scope.Scope`): The scope of the request.
+    Return:
+        dict: The description of the view (path, params, fetch, id.)
+    """
+
+    request_scope.add_fingerprints(params.get('fingerprints') or {})
+
+    node = params.get('tree')
+    if not node:
+        return params
+
+    path = params.get('target')
+    if isinstance(path, list):
+        try:
+            for index in path:
+                node = node['children'][index]
+        except (IndexError, KeyError, TypeError):
+            abort(404)
+    elif path:
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            if path in (node.get('id'), node.get('element_id')):
+                break
+            nodes.extend(node.get('children'))
+        else:
+            abort(404)
+
+    fingerprints = {}
+    nodes = [node]
+    while nodes:
+        child = nodes.pop()
+        fingerprints[child.get('element_id')] = child.get('fingerprint')
+        nodes.extend(child.get('children'))
+    request_scope.add_fingerprints(fingerprints)
+
+    return dict(
+        path=node.get('path'),
+        params=node.get('params'),
+        fetch=node.get('fetch'),
+        id=params.get('id') or node.get('id'))
+
+
+def render_view(lemon, params, context, request_scope):
+    """Render the view of a description.
+
+    Args:
+        lemon (Lemon): The lemon instance.
+        params (dict): The description of the view (path, params, fetch, id.)
+        context (`lazy.LazyContext`): The context of the request.
+        request_scope (`scope.Scope`): The scope of the request.
+
+    Return:
+        `view.View`: The view, rendered.
+    """
+
+    primary_view = start_view(lemon, params, context, request_scope)
+    primary_view.finish()
+    return primary_view
+
+
+def start_view(lemon, params, context, request_scope):
+    """Start rendering the view of a description: a view fetching data is
+    rendered by the pool, until `View.finish` is called.
+
+    Args:
+        lemon (Lemon): The lemon instance.
+        params (dict): The description of the view (path, params, fetch, id.)
+        context (`lazy.LazyContext`): The context of the request.
+        request_scope (`scope.Scope`): The scope of the request.
+
+    Return:
+        `view.View`: The view.
+    """
+
+    params = target(params, request_scope)
     primary_view = view.View(params.get('path'))
+    view.prefetch(lemon, primary_view, params, context, request_scope)
     primary_view.render(
-        context=lemon.context,
+        context=context,
         fetch=params.get('fetch'),
         id=params.get('id'),
         lemon=lemon,
-        params=params.get('params'))
-        
-    primary_view.finish()
-    response = json.dumps(dict(
-        html=primary_view.html,
-        tree=primary_view.to_dict()))
+        params=params.get('params'),
+        scope=request_scope)
+    return primary_view
+
+
+def partial_view(lemon, params, request_scope=None):
+    """Render a partial view.
+
+    Args:
+        lemon (Lemon): The lemon instance.
+        params (dict): The description of the view (path, params, fetch, id.)
+        request_scope (`scope.Scope`): The scope of the request.
+
+    Return:
+        `view.View`: The view, rendered (see `serialize.partial`.)
+    """
+
+    context = lemon.context
+    request_scope = request_scope or scope.Scope()
+    primary_view = render_view(lemon, params, context, request_scope)
+    if request_scope.timings is not None:
+        request_scope.timings.add_context(context)
+    return primary_view
+
+
+def render_partial(lemon, params, request_scope=None):
+    """Render a partial view.
+
+    Args:
+        lemon (Lemon): The lemon instance.
+        params (dict): The description of the view (path, params, fetch, id.)
+        request_scope (`scope.Scope`): The scope of the request.
+
+    Return:
+        `string`: The json object of the view.
+    """
+
+    return ''.join(serialize.partial(
+        partial_view(lemon, params, request_scope)))
+
+
+def render_partials(lemon, descriptions, request_scope=None):
+    """Render several partial views at the same time.
+
+    Args:
+        lemon (Lemon): The lemon instance.
+        descriptions (list): The description of each view.
+        request_scope (`scope.Scope`): The scope of the request.
+
+    Return:
+        `string`: The json object with the result of each view.
+    """
+
+    context = lemon.context
+    request_scope = request_scope or scope.Scope()
+
+    # All the views are started before any is waited for: their fetches run
+    # in the pool at the same time, while this thread renders the others
+    # (the pool is left to the fetching views.)
+    views = []
+    for index, params in enumerate(descriptions):
+        key = params.get('id') or str(index)
+        try:
+            views.append((key, params, start_view(
+                lemon, params, context, request_scope)))
+        except Exception as error:
+            lemon.app.logger.exception('Partial view failed: %s', params)
+            views.append((key, params, error))
+
+    results = {}
+    for key, params, primary_view in views:
+        if isinstance(primary_view, Exception):
+            results[key] = dict(error=str(primary_view))
+            continue
+
+        try:
+            primary_view.finish()
+            results[key] = dict(
+                html=primary_view.html, tree=primary_view.to_dict())
+        except Exception as error:
+            lemon.app.logger.exception('Partial view failed: %s', params)
+            results[key] = dict(error=str(error))
+
+    if request_scope.timings is not None:
+        request_scope.timings.add_context(context)
+    return serialize.dumps(results)
+
+
+async def view_handler_async(lemon, params, request_scope=None):
+    """Generate a partial view (asyncio).
+
+    Args:
+        lemon (Lemon): The lemon instance.
+        params (dict, list): The description of the view (path, params,
+            fetch, id), or the list of descriptions.
+        request_scope (`scope.Scope`): The scope of the request.
+
+    Return:
+        `string`: Contains the json object which will later on be used by
+            Backbone to regenerate the view.
+    """
+
+    context = lemon.context
+    request_scope = request_scope or scope.Scope()
+
+    async def render(params):
+        params = target(params, request_scope)
+        primary_view = view.View(params.get('path'))
+        await primary_view.render_async(
+            context=context,
+            fetch=params.get('fetch'),
+            id=params.get('id'),
+            lemon=lemon,
+            params=params.get('params'),
+            scope=request_scope)
+
+        await primary_view.finish_async()
+        return dict(html=primary_view.html, tree=primary_view.to_dict())
+
+    if not isinstance(params, list):
+        result = await render(params)
+        if request_scope.timings is not None:
+            request_scope.timings.add_context(context)
+        return serialize.dumps(result)
+
+    results = await asyncio.gather(
+        *[render(description) for description in params],
+        return_exceptions=True)
+    if request_scope.timings is not None:
+        request_scope.timings.add_context(context)
 
-    return response
+    response = {}
+    for index, (description, result) in enumerate(zip(params, results)):
+        if isinstance(result, Exception):
+            lemon.app.logger.error(
+                'Partial view failed: %s', description, exc_info=result)
+            result = dict(error=str(result))
+        response[description.get('id') or str(index)] = result
+    return serialize.dumps(response)
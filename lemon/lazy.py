@@ -0,0 +1,119 @@
+"""
+Lazy Context
+============
+
+The context of a request is made of all the functions registered with
+`Lemon.add_context`. Each function is only called when its key is read for the
+first time (by a template, an access check or the api handler), and at most
+once per request.
+
+```python
+@lemon.add_context
+def user():
+    return db.get_user(session['user_id'])
+
+
+@lemon.add_context(ttl=60)
+def settings():
+    return db.get_settings()
+```
+
+Functions declaring a `ttl` are shared between the requests for that number of
+seconds.
+
+Views fetching data are rendered by worker threads: when a function is first
+called from one of them, it runs with a copy of the request context (`request`
+and `session` are available, `g` is not shared.)
+"""
+
+from collections.abc import Mapping
+import threading
+import time
+
+import flask
+
+
+class Provider():
+
+    def __init__(self, fn, ttl=None):
+        """Initialize a context provider.
+
+        Args:
+            fn (Function): The function providing the value.
+            ttl (int): Number of seconds the value is shared between requests.
+        """
+
+        self.fn = fn
+        self.ttl = ttl
+        self.value = None
+        self.expires = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        """Get the value.
+
+        Return:
+            The value of the function (cached if the provider has a ttl.)
+        """
+
+        if not self.ttl:
+            return self.fn()
+
+        with self.lock:
+            if self.expires < time.monotonic():
+                self.value = self.fn()
+                self.expires = time.monotonic() + self.ttl
+            return self.value
+
+
+class LazyContext(Mapping):
+
+    def __init__(self, providers):
+        """Initialize the context of a request.
+
+        Args:
+            providers (dict): The providers of the context (by key.)
+        """
+
+        self.providers = providers
+        self.values = {}
+        self.timings = {}
+        self.lock = threading.RLock()
+        self.thread = threading.current_thread()
+        self.request_context = (
+            flask._request_ctx_stack.top
+            if flask.has_request_context() else None)
+
+    def __getitem__(self, key):
+        if key in self.values:
+            return self.values[key]
+
+        provider = self.providers[key]
+        with self.lock:
+            if key not in self.values:
+                start = time.perf_counter()
+                self.values[key] = self.evaluate(provider)
+                self.timings[key] = time.perf_counter() - start
+        return self.values[key]
+
+    def __iter__(self):
+        return iter(self.providers)
+
+    def __len__(self):
+        return len(self.providers)
+
+    def evaluate(self, provider):
+        """Call a provider.
+
+        Args:
+            provider (`Provider`): The provider.
+        Return:
+            The value.
+        """
+
+        if (not self.request_context or
+                threading.current_thread() is self.thread):
+            return provider()
+
+        with self.request_context.copy():
+            return provider()
@@ -16,6 +16,73 @@ Configuration
 - _View Path (view_path)_: Where all the views are located. For consistency,
   they should all be in the same directory.
 
+- _Fetch Workers (LEMON_FETCH_WORKERS)_: Number of threads shared by all the
+  views that fetch data. `LEMON_FETCH_QUEUE_SIZE` bounds the number of views
+  waiting for a worker. See `lemon.pool`.
+
+- _Asyncio (LEMON_ASYNC)_: Render the views on an event loop, API handlers can
+  then provide an `async def get`. See `lemon.aio`.
+
+- _Streaming (LEMON_STREAM)_: Send the application shell right away and flush
+  the views fetching data as they are rendered. Can also be enabled per route
+  with the `stream` option.
+
+- _API Cache (LEMON_API_CACHE_TTL)_: Cache the responses of the API handler.
+  Each fetch can set its own `ttl`. See `lemon.cache`.
+
+- _Batched Fetches (LEMON_FETCH_BATCH)_: When the API handler provides
+  `get_many(context, requests)`, the fetches of each level of the view tree
+  are sent in a single call. `requests` is a list of dict (`view_name`,
+  `endpoint`, `params`), and a list of responses is expected in return.
+
+- _Fragment Cache (LEMON_FRAGMENT_CACHE_SIZE)_: Views declaring it (e.g.
+  `describe(cache=60)`) have their html cached. See `lemon.cache`.
+
+- _Precompilation (LEMON_PRECOMPILE)_: Compile all the views at startup, and
+  keep them in a bytecode cache shared by the worker processes
+  (`LEMON_BYTECODE_CACHE`). See `lemon.templates`.
+
+- _Conditional Requests (LEMON_ETAG)_: Add an etag to the pages, and answer
+  with a 304 when the page has not changed. Routes can also set their own
+  `etag` and `cache_control` options. `LEMON_VIEW_ETAG` and
+  `LEMON_VIEW_CACHE_CONTROL` apply to the `/view/` endpoint.
+
+- _Server Timing (LEMON_SERVER_TIMING)_: Measure the rendering of each view
+  and send the slowest steps (`LEMON_SERVER_TIMING_TOP`) in a `Server-Timing`
+  header. See `lemon.timing`.
+
+- _Deadlines (LEMON_RENDER_DEADLINE)_: Number of seconds the views of a
+  request have to be rendered. `LEMON_FETCH_TIMEOUT` (or the `timeout` of a
+  fetch) limits each view fetching data. The views missing their deadline
+  render a fallback, and are listed in the `X-Lemon-Degraded` header (their
+  ancestors are not stored in the fragment cache.) Views rendered outside of
+  the pool pass their deadline to the api handler (see
+  `ApiHandler.get_within`.) Batched views are not limited. See
+  `View.degrade`.
+
+- _Deferred Views (LEMON_VIEW_SIGNED)_: Views rendered with `defer=True` are
+  loaded by the client. Their description is signed with the `SECRET_KEY`,
+  and `LEMON_VIEW_SIGNED` restricts the `/view/` endpoint to signed
+  descriptions. See `lemon.defer`.
+
+- _Prefetch (LEMON_PREFETCH)_: Analyze the templates at startup, and start
+  all the fetches known before rendering at the beginning of the request.
+  See `lemon.graph`.
+
+- _Template Reload (LEMON_AUTO_RELOAD)_: Check the templates on disk each time
+  they are used. When disabled, templates are reloaded with
+  `Lemon.reload_views`, or by watching the views every `LEMON_WATCH_INTERVAL`
+  seconds. See `lemon.watch`.
+
+- _Static Views (LEMON_STATIC_VIEWS)_: Views whose template uses neither
+  `params`, `data`, `context`, child views nor other templates are rendered
+  once, and their html is reused (default: False.) See
+  `templates.is_static`.
+
+- _Compression (LEMON_COMPRESS)_: Compress the responses whose etag comes
+  back, once per encoding the clients accept (gzip, and brotli when
+  installed), and send the stored bytes. See `lemon.compress`.
+
 Example
 -------
 
@@ -34,16 +101,23 @@ lemon = Lemon(app, app_view='AppView', view_path='views/')
 """
 
 from flask import current_app
+import functools
 
+from lemon import cache
+from lemon import graph
+from lemon import handlers
+from lemon import lazy
+from lemon import pool
 from lemon import route
+from lemon import templates
 from lemon import view
-from lemon import handlers
+from lemon import watch
 
 
 class Lemon(object):
 
     def __init__(self, app=None, app_view=None, view_path=None,
-                 api_handler=None):
+                 api_handler=None, api_cache=None, fragment_cache=None):
         """Initialize Lemon.
 
         Create one instance of Lemon and defines the basic configuration of the
@@ -54,12 +128,23 @@ class Lemon(object):
             app_view (string): The application main view.
             view_path (string): The application view path.
             api_handler: The API handler.
+            api_cache: The store of the API responses (see `lemon.cache`.)
+            fragment_cache: The store of the html of the views.
         """
 
         self.app = app
         self.route_views = []
         self._context = {}
         self.api_handler = api_handler
+        self.pool = None
+        self.async_env = None
+        self.graph = None
+        self.watcher = None
+        self.static_views = None
+        self.compressed = None
+        self.api_cache = cache.Cache(api_cache) if api_cache else None
+        self.fragment_cache = (
+            cache.FragmentCache(fragment_cache) if fragment_cache else None)
 
         if app is not None:
             self.init_app(app, app_view, view_path)
@@ -76,6 +161,34 @@ class Lemon(object):
         # Set all the app configuration.
         app.config.setdefault('LEMON_APP_VIEW', app_view or 'App')
         app.config.setdefault('LEMON_VIEW_PATH', view_path or '/views/')
+        app.config.setdefault('LEMON_FETCH_WORKERS', 16)
+        app.config.setdefault('LEMON_FETCH_QUEUE_SIZE', 256)
+        app.config.setdefault('LEMON_ASYNC', False)
+        app.config.setdefault('LEMON_STREAM', False)
+        app.config.setdefault('LEMON_API_CACHE_SIZE', 1024)
+        app.config.setdefault('LEMON_API_CACHE_TTL', 0)
+        app.config.setdefault('LEMON_FETCH_BATCH', False)
+        app.config.setdefault('LEMON_FRAGMENT_CACHE_SIZE', 512)
+        app.config.setdefault('LEMON_PRECOMPILE', False)
+        app.config.setdefault('LEMON_BYTECODE_CACHE', None)
+        app.config.setdefault('LEMON_TEMPLATE_CACHE_SIZE', 400)
+        app.config.setdefault('LEMON_ETAG', False)
+        app.config.setdefault('LEMON_VIEW_ETAG', False)
+        app.config.setdefault('LEMON_VIEW_CACHE_CONTROL', None)
+        app.config.setdefault('LEMON_SERVER_TIMING', False)
+        app.config.setdefault('LEMON_SERVER_TIMING_TOP', 10)
+        app.config.setdefault('LEMON_RENDER_DEADLINE', None)
+        app.config.setdefault('LEMON_FETCH_TIMEOUT', None)
+        app.config.setdefault('LEMON_VIEW_SIGNED', False)
+        app.config.setdefault('LEMON_PREFETCH', False)
+        app.config.setdefault('LEMON_AUTO_RELOAD', True)
+        app.config.setdefault('LEMON_WATCH_INTERVAL', None)
+        app.config.setdefault('LEMON_STATIC_VIEWS', False)
+        app.config.setdefault('LEMON_COMPRESS', False)
+        app.config.setdefault('LEMON_COMPRESS_CACHE_SIZE', 256)
+        app.config.setdefault('LEMON_COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('LEMON_COMPRESS_LEVEL', 6)
+        app.config.setdefault('LEMON_COMPRESS_BROTLI_QUALITY', 4)
 
         if not hasattr(app, 'extensions'):
             app.extensions = {}
@@ -83,10 +196,101 @@ class Lemon(object):
 
         # Create the environment
         view.create_environment(self)
+        if app.config['LEMON_PRECOMPILE']:
+            templates.precompile(app.jinja_env)
+            if app.config['LEMON_ASYNC']:
+                templates.precompile(self.async_env)
+
+        if app.config['LEMON_PREFETCH']:
+            self.graph = graph.analyze(app.jinja_env)
+
+        if app.config['LEMON_STATIC_VIEWS']:
+            self.static_views = {}
+
+        if not self.api_cache:
+            self.api_cache = cache.Cache(
+                cache.LRUCache(app.config['LEMON_API_CACHE_SIZE']))
+
+        if not self.fragment_cache:
+            self.fragment_cache = cache.FragmentCache(
+                cache.LRUCache(app.config['LEMON_FRAGMENT_CACHE_SIZE']))
+
+        if app.config['LEMON_COMPRESS']:
+            self.compressed = cache.LRUCache(
+                app.config['LEMON_COMPRESS_CACHE_SIZE'])
+
+        if app.config['LEMON_WATCH_INTERVAL']:
+            self.watcher = watch.Watcher(
+                app.config['LEMON_VIEW_PATH'],
+                app.config['LEMON_WATCH_INTERVAL'], self.reload_views)
+            self.watcher.start()
+
+        # Create the pool used to render the views that fetch data.
+        self.pool = pool.Pool(
+            app.config['LEMON_FETCH_WORKERS'],
+            app.config['LEMON_FETCH_QUEUE_SIZE'])
 
         # Register the routes
         self.add_route('/view/', handlers.view_handler, app, methods=['GET'])
 
+    def shutdown(self, wait=True):
+        """Stop the workers rendering the views.
+
+        Args:
+            wait (bool): Wait for the views being rendered to complete.
+        """
+
+        if self.pool:
+            self.pool.shutdown(wait=wait)
+            self.pool = None
+
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+
+    def invalidate_view(self, path):
+        """Invalidate the cached html of a view.
+
+        Args:
+            path (string): The path of the view.
+        """
+
+        if self.fragment_cache:
+            self.fragment_cache.invalidate(path)
+
+    def reload_views(self, names=None):
+        """Reload the templates of the views.
+
+        The templates are evicted from the jinja2 environments, with the
+        fragments of their views, their dependencies and the html of the
+        static views. See `lemon.watch`.
+
+        Args:
+            names (list): The names of the templates which changed (e.g.
+                `Nav/Nav.nunjucks`), all of them by default.
+        """
+
+        env = self.app.jinja_env
+        watch.evict(env, names)
+        watch.evict(self.async_env, names)
+
+        if self.graph is not None:
+            if names is None:
+                self.graph = graph.analyze(env)
+            else:
+                graph.update(self.graph, env, names)
+
+        if self.static_views:
+            for name in names or list(self.static_views):
+                self.static_views.pop(name, None)
+
+        if self.fragment_cache:
+            paths = (
+                list(self.fragment_cache.views) if names is None
+                else [watch.view_path(name) for name in names])
+            for path in paths:
+                self.fragment_cache.invalidate(path)
+
     def add_route(self, rule, handler, app=None, **options):
         """Add a new route.
 
@@ -112,11 +316,26 @@ class Lemon(object):
     @property
     def context(self):
         """Provides additional template context.
+
+        The context is lazy: each function is called when its key is read for
+        the first time. See `lemon.lazy`.
+        """
+
+        return lazy.LazyContext(self._context)
+
+    def add_context(self, fn=None, ttl=None):
+        """Register a context function.
+
+        Can be used as a decorator, with or without arguments.
+
+        Args:
+            fn (Function): The function, its name is the key of the context.
+            ttl (int): Number of seconds the value is shared between requests.
         """
 
-        return {key: fn() for key, fn in self._context.items()}
+        if fn is None:
+            return functools.partial(self.add_context, ttl=ttl)
 
-    def add_context(self, fn):
         name = fn.__name__
-        self._context.update({name: fn})
+        self._context.update({name: lazy.Provider(fn, ttl)})
         return fn
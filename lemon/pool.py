@@ -0,0 +1,68 @@
+"""
+Pool
+====
+
+Views that fetch data are rendered in the background so their siblings can be
+drawn at the same time. Instead of creating one thread per view, all the
+renders of a lemon instance share a bounded pool of workers.
+
+Configuration
+-------------
+
+- `LEMON_FETCH_WORKERS`: Number of worker threads (default: 16).
+- `LEMON_FETCH_QUEUE_SIZE`: Number of renders that can wait for a worker
+  (default: 256). When the pool is saturated, the view is rendered right away
+  in the thread that requested it.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+
+class Pool():
+
+    def __init__(self, workers, queue_size=0):
+        """Initialize the pool.
+
+        Args:
+            workers (int): The number of worker threads.
+            queue_size (int): The number of tasks that can wait for a worker.
+        """
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='lemon')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, fn, *args):
+        """Schedule a task on the pool.
+
+        Args:
+            fn (Function): The task.
+            args: The arguments of the task.
+        Return:
+            `Future`: The future of the task, or `None` if the pool is
+                saturated (in which case the caller should run the task
+                itself.)
+        """
+
+        if not self.slots.acquire(blocking=False):
+            return None
+
+        try:
+            future = self.executor.submit(fn, *args)
+        except RuntimeError:
+            # The pool has been shutdown.
+            self.slots.release()
+            return None
+
+        future.add_done_callback(lambda future: self.slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        """Stop the workers.
+
+        Args:
+            wait (bool): Wait for the pending tasks to complete.
+        """
+
+        self.executor.shutdown(wait=wait)
@@ -1,11 +1,23 @@
 import re
+import time
 
+from flask import Response
 from flask import abort
 from flask import current_app
 from flask import request
+from lemon import aio
+from lemon import compress
+from lemon import scope
+from lemon import timing
 from lemon import view
 
 
+PLACEHOLDER_PATTERN = re.compile(r'(<[^<>]+>|\{[^{}]+\})')
+
+# Marks the options removed from the view options.
+DROP = object()
+
+
 def add(lemon, rule, handler=None, app=None, **options):
     """Add a url endpoint.
 
@@ -29,18 +41,62 @@ def add(lemon, rule, handler=None, app=None, **options):
             method or the handler itself.
         access (list): List of all the access methods to run, if one of those
             methods returns false, a 403 is returned.
+        stream (bool): Stream the page, the views fetching data are flushed
+            once they are rendered (see `view.stream_main_view`.)
+        cache (int): Number of seconds the html of the primary view can be
+            cached (see `lemon.cache`.)
+        etag (bool): Add an etag to the response, and answer the requests
+            with a matching `If-None-Match` with a 304 (default:
+            `LEMON_ETAG`.)
+        cache_control (string): The `Cache-Control` header of the response.
+        deadline (float): Number of seconds the views have to be rendered
+            (default: `LEMON_RENDER_DEADLINE`), see `View.degrade`.
+        defer (bool): Defer the primary view, the client loads it later (see
+            `lemon.defer`.)
     """
 
+    plan = compile_options(options)
+
     def callback(*args, **kwargs):
-        check_access(options.get('access') or [])
+        request_scope = scope.Scope()
+        deadline = options.get(
+            'deadline', current_app.config.get('LEMON_RENDER_DEADLINE'))
+        if deadline:
+            request_scope.deadline = time.monotonic() + deadline
+
+        if current_app.config.get('LEMON_SERVER_TIMING'):
+            request_scope.timings = timing.Timings()
+            start = time.perf_counter()
+            check_access(options.get('access') or [])
+            request_scope.timings.add('access', time.perf_counter() - start)
+        else:
+            check_access(options.get('access') or [])
 
         if isinstance(handler, str):  # pragma: no cover
             # Test in: tests/test_routes.py:test_route_fetch
-            replacements = {'{' + k + '}': v for k, v in request.args.items()}
-            replacements.update({'<' + k + '>': v for k, v in kwargs.items()})
-            view_options = prepare(options, replacements)
-            html = view.render_main_view(lemon, handler, **view_options)
-            return html
+            view_options = plan.fill(kwargs, request.args)
+            if (view_options.get('stream') or
+                    current_app.config.get('LEMON_STREAM')):
+                request_scope.timings = None
+                return Response(
+                    view.stream_main_view(
+                        lemon, handler, scope=request_scope, **view_options),
+                    mimetype='text/html')
+
+            if current_app.config.get('LEMON_ASYNC'):
+                html = aio.run(view.render_main_view_async(
+                    lemon, handler, scope=request_scope, **view_options))
+            else:
+                html = view.render_main_view(
+                    lemon, handler, scope=request_scope, **view_options)
+
+            etag = None
+            if options.get('etag', current_app.config.get('LEMON_ETAG')):
+                etag = request_scope.etag(html)
+
+            return conditional(
+                html, etag=etag, cache_control=options.get('cache_control'),
+                headers=scope_headers(request_scope))
 
         elif callable(handler):
             kwargs.update(options=options)
@@ -63,6 +119,74 @@ def add(lemon, rule, handler=None, app=None, **options):
         rule, key, callback, methods=options.get('methods'))
 
 
+def conditional(body, etag=None, cache_control=None, mimetype='text/html',
+                headers=None):
+    """Create a response that answers conditional requests.
+
+    Args:
+        body (string, generator): The body of the response (a generator
+            is streamed.)
+        etag (string): The etag of the body (see `scope.Scope.etag`), a 304
+            is returned if it matches the `If-None-Match` of the request.
+        cache_control (string): The `Cache-Control` header.
+        mimetype (string): The mimetype of the response.
+        headers (dict): Additional headers.
+    Return:
+        `flask.Response`: The response (compressed, see `lemon.compress`),
+            or the body if it is a string and none of the options are set.
+    """
+
+    if (isinstance(body, str) and
+            not etag and not cache_control and not headers):
+        return body
+
+    encoding = None
+    if etag and isinstance(body, str) and etag not in request.if_none_match:
+        encoded = compress.lookup(
+            current_app.extensions.get('lemon'), body, etag,
+            request.accept_encodings)
+        if encoded:
+            # The stored bytes are the body, they are not copied.
+            body, encoding = encoded
+
+    response = Response(body, mimetype=mimetype, headers=headers)
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+
+    if encoding:
+        response.vary.add('Accept-Encoding')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+
+    if etag:
+        response.set_etag(etag)
+        response.make_conditional(request)
+    return response
+
+
+def scope_headers(request_scope):
+    """Create the headers reporting on the rendering of a request.
+
+    - `Server-Timing`: The timings of the request, when it is measured.
+    - `X-Lemon-Degraded`: The paths of the views which missed their
+      deadline (see `View.degrade`.)
+
+    Args:
+        request_scope (`scope.Scope`): The scope of the request.
+    Return:
+        dict: The headers, or `None` if there are none.
+    """
+
+    headers = {}
+    if request_scope.timings is not None:
+        headers['Server-Timing'] = request_scope.timings.header(
+            current_app.config.get('LEMON_SERVER_TIMING_TOP'))
+
+    if request_scope.degraded:
+        headers['X-Lemon-Degraded'] = ', '.join(request_scope.degraded)
+    return headers or None
+
+
 def check_access(access):
     """Check the access of an endpoint.
     """
@@ -115,3 +239,132 @@ def prepare(options, replacements):
 
         view_options[key] = clear_value
     return view_options
+
+
+class Plan():
+    """Substitution plan of the route options.
+
+    The options are walked once, when the route is added: only the values
+    containing placeholders are filled for each request, the other values are
+    shared by all the requests.
+    """
+
+    def __init__(self, options):
+        """Compile options.
+
+        Args:
+            options (dict): The options of the route.
+        """
+
+        self.static = {}
+        self.slots = {}
+
+        for key, value in options.items():
+            if isinstance(value, dict):
+                plan = Plan(value)
+                if plan.slots:
+                    self.slots[key] = plan
+                    continue
+                value = plan.static
+
+            elif isinstance(value, str):
+                template = Template(value)
+                if template.slots:
+                    self.slots[key] = template
+                    continue
+
+            value = clean(value)
+            if value is not DROP:
+                self.static[key] = value
+
+    def fill(self, url_args, query_args):
+        """Fill the placeholders.
+
+        Args:
+            url_args (dict): The values of the `<url_arg>` placeholders.
+            query_args (dict): The values of the `{query_arg}` placeholders.
+        Return:
+            dict: The options with the values.
+        """
+
+        if not self.slots:
+            return self.static
+
+        options = dict(self.static)
+        for key, slot in self.slots.items():
+            value = clean(slot.fill(url_args, query_args))
+            if value is not DROP:
+                options[key] = value
+        return options
+
+
+class Template():
+    """Substitution plan of a string option.
+    """
+
+    def __init__(self, value):
+        """Compile a string.
+
+        Args:
+            value (string): The string, with its placeholders.
+        """
+
+        self.segments = PLACEHOLDER_PATTERN.split(value)
+        self.slots = [
+            (index, self.segments[index][0], self.segments[index][1:-1])
+            for index in range(1, len(self.segments), 2)]
+
+    def fill(self, url_args, query_args):
+        """Fill the placeholders.
+
+        Placeholders without a value are left untouched. A string that is a
+        single placeholder takes the value as is (e.g. an int url argument.)
+
+        Args:
+            url_args (dict): The values of the `<url_arg>` placeholders.
+            query_args (dict): The values of the `{query_arg}` placeholders.
+        Return:
+            The string with the values.
+        """
+
+        segments = list(self.segments)
+        for index, kind, name in self.slots:
+            value = (url_args if kind == '<' else query_args).get(name)
+            if value:
+                segments[index] = value
+
+        if len(segments) == 3 and not segments[0] and not segments[2]:
+            return segments[1]
+        return ''.join(str(segment) for segment in segments)
+
+
+def clean(value):
+    """Clean a value of the view options.
+
+    Args:
+        value: The value.
+    Return:
+        The value, `None` if it is an unresolved query placeholder, or `DROP`
+            if it is empty.
+    """
+
+    if not value:
+        return DROP
+
+    if isinstance(value, str) and value[0] == '{' and value[-1] == '}':
+        return None
+    return value
+
+
+def compile_options(options):
+    """Compile the options of a route.
+
+    Args:
+        options (dict): the options of the view (includes the params, and
+            fetch).
+    Return:
+        `Plan`: The plan filling the placeholders of each request (see
+            `prepare`.)
+    """
+
+    return Plan(options)
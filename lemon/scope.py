@@ -0,0 +1,191 @@
+"""
+Scope
+=====
+
+A scope is shared by all the views rendered for one request. It makes sure the
+views fetching the same endpoint with the same params (e.g. the current
+account, fetched by several widgets) share a single call to the API handler.
+
+When the fetches are batched (`LEMON_FETCH_BATCH`), the scope also holds the
+views waiting for the next batch. Each thread has its own batch: the children
+queued while rendering a template are finished by the same thread, and
+several views can be rendered at the same time for one request (see
+`handlers.render_partials`.)
+
+The element ids of the views are made of a random prefix (unique to the
+request) and a counter. They can be told apart from any other content of the
+page, which allows to compute an etag that does not depend on them.
+
+When the request is measured, the scope holds its timings (see
+`lemon.timing`.) It also holds the deadline of the request (see
+`LEMON_RENDER_DEADLINE`) and the views which missed it.
+"""
+
+from concurrent.futures import Future
+import asyncio
+import hashlib
+import itertools
+import re
+import threading
+import uuid
+
+
+class Scope():
+
+    def __init__(self):
+        """Initialize the scope of a request.
+        """
+
+        self.flights = {}
+        self.async_flights = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+        self.prefix = 'v%s-' % uuid.uuid4().hex[:8]
+        self.counter = itertools.count()
+        self.fingerprints = {}
+        self.timings = None
+        self.deadline = None
+        self.degraded = []
+
+    def add_fingerprints(self, fingerprints):
+        """Add the fingerprints of the views the client already has.
+
+        Args:
+            fingerprints (dict): The fingerprint of each element id.
+        """
+
+        with self.lock:
+            for element_id, fingerprint in fingerprints.items():
+                self.fingerprints.setdefault(fingerprint, []).append(
+                    element_id)
+
+    def take_fingerprint(self, fingerprint):
+        """Take the element id of a view the client already has.
+
+        Args:
+            fingerprint (string): The fingerprint of the view.
+        Return:
+            string: The element id, or `None`.
+        """
+
+        with self.lock:
+            element_ids = self.fingerprints.get(fingerprint)
+            return element_ids.pop(0) if element_ids else None
+
+    def degrade(self, view):
+        """Record a view that missed its deadline.
+
+        Args:
+            view (`View`): The view.
+        """
+
+        with self.lock:
+            self.degraded.append(view.path)
+
+    def new_element_id(self):
+        """Create an element id, unique within the page.
+
+        Return:
+            string: The element id.
+        """
+
+        return '%s%d' % (self.prefix, next(self.counter))
+
+    def etag(self, body):
+        """Compute the etag of a response.
+
+        The element ids are numbered by order of appearance: the etag only
+        changes when the content does.
+
+        Args:
+            body (string): The body of the response.
+        Return:
+            string: The etag.
+        """
+
+        ids = {}
+        body = re.sub(
+            re.escape(self.prefix) + r'\d+',
+            lambda match: str(ids.setdefault(match.group(0), len(ids))),
+            body)
+        return hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+    def add_batch(self, view):
+        """Queue a view in the next batch of the current thread.
+
+        Args:
+            view (`View`): The view.
+        """
+
+        with self.lock:
+            self.batches.setdefault(threading.get_ident(), []).append(view)
+
+    def pop_batch(self):
+        """Take the views waiting for the next batch of the current thread.
+
+        Return:
+            list: The views.
+        """
+
+        with self.lock:
+            return self.batches.pop(threading.get_ident(), [])
+
+    def claim(self, key):
+        """Claim a call: the first caller gets a future to resolve, the
+        others get the same future to wait on.
+
+        Args:
+            key (string): The key of the call.
+        Return:
+            tuple: The future, and if the caller owns it.
+        """
+
+        with self.lock:
+            future = self.flights.get(key)
+            if future is not None:
+                return future, False
+
+            future = self.flights[key] = Future()
+            return future, True
+
+    def single_flight(self, key, fn):
+        """Call a function once per key.
+
+        The first caller runs the function, the other callers (from any
+        thread) wait for its result.
+
+        Args:
+            key (string): The key of the call.
+            fn (Function): The function to call.
+        Return:
+            The result of the function.
+        """
+
+        future, owner = self.claim(key)
+        if not owner:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+
+        future.set_result(result)
+        return result
+
+    async def single_flight_async(self, key, fn):
+        """Await a coroutine function once per key (asyncio).
+
+        Args:
+            key (string): The key of the call.
+            fn (Function): The coroutine function to call.
+        Return:
+            The result of the coroutine.
+        """
+
+        future = self.async_flights.get(key)
+        if not future:
+            future = asyncio.ensure_future(fn())
+            self.async_flights[key] = future
+        return await asyncio.shield(future)
@@ -0,0 +1,101 @@
+"""
+Serialize
+=========
+
+The response of the `/view/` endpoint is written straight from the view: the
+html and each node of the tree are serialized one after the other, and can be
+streamed, without building the dictionary of the whole tree first.
+
+The html of the view (already safe markup) is only escaped as a json string,
+in chunks of `CHUNK_SIZE` characters.
+
+[orjson](https://github.com/ijl/orjson) is used when it is installed, the
+standard `json` module otherwise.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+# Number of characters of html serialized at once.
+CHUNK_SIZE = 65536
+
+
+def dumps(obj):
+    """Serialize an object.
+
+    Args:
+        obj: The object.
+    Return:
+        string: The json.
+    """
+
+    if orjson:
+        try:
+            return orjson.dumps(
+                obj, default=str,
+                option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:
+            # e.g. integers larger than 64 bits.
+            pass
+    return json.dumps(obj, default=str, separators=(',', ':'))
+
+
+def string(value):
+    """Serialize a string, in chunks.
+
+    Args:
+        value (string): The string.
+    Return:
+        generator: The json of the string.
+    """
+
+    yield '"'
+    for start in range(0, len(value), CHUNK_SIZE):
+        yield dumps(str(value[start:start + CHUNK_SIZE]))[1:-1]
+    yield '"'
+
+
+def tree(view):
+    """Serialize the tree of a view (see `View.to_dict`.)
+
+    Args:
+        view (`View`): The view.
+    Return:
+        generator: The json of the tree.
+    """
+
+    yield dumps(view.node())[:-1]
+    yield ',"children":'
+
+    if view.cached_children is not None:
+        yield dumps(view.cached_children)
+        yield '}'
+        return
+
+    yield '['
+    for index, child in enumerate(view.children):
+        if index:
+            yield ','
+        yield from tree(child)
+    yield ']}'
+
+
+def partial(primary_view):
+    """Serialize the html and the tree of a partial view.
+
+    Args:
+        primary_view (`View`): The view (rendered.)
+    Return:
+        generator: The json of the view.
+    """
+
+    yield '{"html":'
+    yield from string(primary_view.html)
+    yield ',"tree":'
+    yield from tree(primary_view)
+    yield '}'
@@ -0,0 +1,128 @@
+"""
+Templates
+=========
+
+Helpers for the jinja2 environments of the views (see
+`view.create_environment`.)
+
+Configuration
+-------------
+
+- `LEMON_PRECOMPILE`: Compile all the views (`*.nunjucks` in
+  `LEMON_VIEW_PATH`) when the application starts (default: False.)
+- `LEMON_BYTECODE_CACHE`: Directory where the compiled templates are kept.
+  The directory can be shared by several worker processes (default: None,
+  templates are compiled by each process.)
+- `LEMON_TEMPLATE_CACHE_SIZE`: Number of compiled templates kept in memory.
+  It should be higher than the number of views to avoid recompiling them
+  under load. `0` disables the cache and `-1` never evicts a template
+  (default: 400.)
+- `LEMON_STATIC_VIEWS`: Render the static views once (see `is_static`),
+  and reuse their html (default: False.)
+"""
+
+import os
+import tempfile
+
+import jinja2
+import jinja2.defaults
+import jinja2.meta
+from jinja2 import nodes
+
+
+# Names a static view can use: they do not depend on the request.
+STATIC_NAMES = frozenset([
+    'describe', 'jsonify', 'Api', 'range', 'dict', 'cycler', 'joiner',
+    'namespace'])
+
+# Nodes rendering other templates.
+TEMPLATE_NODES = (
+    nodes.Include, nodes.Extends, nodes.Import, nodes.FromImport)
+
+# Filters a static view can use.
+STATIC_FILTERS = frozenset(jinja2.defaults.DEFAULT_FILTERS) - {'random'}
+
+
+class BytecodeCache(jinja2.FileSystemBytecodeCache):
+    """Bytecode cache shared by several processes.
+
+    The compiled templates are written in a temporary file which is then
+    renamed, so other processes never load a partially written file.
+    """
+
+    def dump_bytecode(self, bucket):
+        fd, filename = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                bucket.write_bytecode(f)
+            os.replace(filename, self._get_cache_filename(bucket))
+        except BaseException:
+            os.remove(filename)
+            raise
+
+
+def bytecode_cache(directory, name):
+    """Create the bytecode cache of an environment.
+
+    Args:
+        directory (string): The directory of the cache (created if missing.)
+        name (string): The name of the environment (environments compile the
+            templates differently, they can not share the same files.)
+    Return:
+        `BytecodeCache`: The cache, or `None` if there is no directory.
+    """
+
+    if not directory:
+        return None
+
+    os.makedirs(directory, exist_ok=True)
+    return BytecodeCache(directory, 'lemon_%s_%%s.cache' % name)
+
+
+def is_static(env, name):
+    """Check if a view is static: its html does not depend on anything else
+    than its template (no `params`, `data`, `context`, child `view` or other
+    template.)
+
+    Args:
+        env (`jinja2.Environment`): The environment of the views.
+        name (string): The name of the template.
+    Return:
+        bool: If the view is static.
+    """
+
+    try:
+        source, _, _ = env.loader.get_source(env, name)
+    except jinja2.TemplateNotFound:
+        return False
+
+    # Parsed without globals: all the names used are reported.
+    analysis_env = jinja2.Environment()
+    analysis_env.globals.clear()
+    ast = analysis_env.parse(source)
+
+    if not jinja2.meta.find_undeclared_variables(ast) <= STATIC_NAMES:
+        return False
+
+    # Other templates are rendered with the context of the view.
+    if any(ast.find_all(TEMPLATE_NODES)):
+        return False
+
+    return all(
+        node.name in STATIC_FILTERS for node in ast.find_all(nodes.Filter))
+
+
+def precompile(env):
+    """Compile all the views of an environment.
+
+    Args:
+        env (`jinja2.Environment`): The environment.
+    Return:
+        int: The number of views compiled.
+    """
+
+    names = env.list_templates(
+        filter_func=lambda name: name.endswith('.nunjucks'))
+    for name in names:
+        env.get_template(name)
+    return len(names)
@@ -0,0 +1,157 @@
+"""
+Timing
+======
+
+Measure where the time of a request goes: each view records the time spent
+fetching its data (`fetch`), rendering its template (`template`), waiting for
+its children (`children`) and putting them in place (`stitch`.) The evaluation
+of the context (`context`) and the access checks (`access`) are measured too.
+
+The timings of the `/view/` endpoint are included in the tree of the views
+(see `View.to_dict`), and the slowest entries are sent in a `Server-Timing`
+header:
+
+```
+Server-Timing: fetch;desc="Artists";dur=120.4, template;desc="App";dur=3.1
+```
+
+Nothing is measured unless the timings are enabled: the views then only
+check that they have no timings.
+
+Configuration
+-------------
+
+- `LEMON_SERVER_TIMING`: Measure the requests and add the `Server-Timing`
+  header (default: False.) Streamed pages are not measured.
+- `LEMON_SERVER_TIMING_TOP`: Number of entries in the header (default: 10.)
+"""
+
+import threading
+import time
+
+
+class Timings():
+
+    def __init__(self):
+        """Initialize the timings of a request.
+        """
+
+        self.entries = []
+        self.lock = threading.Lock()
+
+    def add(self, name, duration, description=None):
+        """Add an entry.
+
+        Args:
+            name (string): The name of the entry (e.g. `fetch`.)
+            duration (float): The duration, in seconds.
+            description (string): What was measured (e.g. the path of the
+                view.)
+        """
+
+        with self.lock:
+            self.entries.append((name, duration, description))
+
+    def add_context(self, context):
+        """Add the time spent evaluating the context.
+
+        Args:
+            context (`lazy.LazyContext`): The context of the request.
+        """
+
+        for key, duration in list(getattr(context, 'timings', {}).items()):
+            self.add('context', duration, key)
+
+    def header(self, top=None):
+        """Create the `Server-Timing` header.
+
+        Args:
+            top (int): The number of entries kept (the slowest ones.)
+        Return:
+            string: The value of the header.
+        """
+
+        with self.lock:
+            entries = sorted(
+                self.entries, key=lambda entry: entry[1], reverse=True)
+
+        return ', '.join(
+            '%s;%sdur=%.1f' % (
+                name,
+                'desc="%s";' % description.replace('"', "'")
+                if description else '',
+                duration * 1000)
+            for name, duration, description in entries[:top])
+
+
+class Timer():
+
+    def __init__(self, view, name):
+        """Initialize a timer.
+
+        Args:
+            view (`View`): The view measured.
+            name (string): The name of the entry.
+        """
+
+        self.view = view
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        duration = time.perf_counter() - self.start
+        timings = self.view.timings
+        timings[self.name] = timings.get(self.name, 0) + duration
+        if self.view.scope and self.view.scope.timings is not None:
+            self.view.scope.timings.add(self.name, duration, self.view.path)
+
+
+class NullTimer():
+    """Timer of the views that are not measured.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def measure(view, name):
+    """Measure a step of the rendering of a view.
+
+    ```python
+    with timing.measure(self, 'fetch'):
+        self.fetch(lemon, context)
+    ```
+
+    Args:
+        view (`View`): The view.
+        name (string): The name of the step.
+    Return:
+        The timer (a shared timer that does nothing when the view has no
+            timings.)
+    """
+
+    if view.timings is None:
+        return NULL_TIMER
+    return Timer(view, name)
+
+
+def milliseconds(timings):
+    """Convert the timings of a view in milliseconds.
+
+    Args:
+        timings (dict): The duration (in seconds) of each step.
+    Return:
+        dict: The duration (in milliseconds) of each step.
+    """
+
+    return {name: round(value * 1000, 3) for name, value in timings.items()}
@@ -26,19 +26,80 @@ Date:
     09/25/2014
 """
 
-from threading import Thread
+from concurrent.futures import TimeoutError
+from concurrent.futures import as_completed
 from flask import current_app
+import asyncio
+import builtins
 import flask
+import functools
+import hashlib
 import jinja2
+import json
 import os
 import os.path
+import itertools
+import re
+import sys
+import time
+import types
 import uuid
 
 from lemon import api
+from lemon import cache
+from lemon import defer
+from lemon import graph
+from lemon import scope
+from lemon import templates
+from lemon import timing
+
+
+# Views rendered in the background leave a placeholder in the html of their
+# parent. The placeholders contain a random token (which can not be guessed by
+# user data) and the element id of the view.
+PLACEHOLDER_TOKEN = uuid.uuid4().hex
+PLACEHOLDER = '\x1a%s:%%s\x1a' % PLACEHOLDER_TOKEN
+PLACEHOLDER_PATTERN = re.compile('\x1a%s:([^\x1a]*)\x1a' % PLACEHOLDER_TOKEN)
+
+# Streamed pages leave a slot for each view that is not yet rendered, the view
+# is sent later on in a template and swapped in by `lemonFill`.
+SLOT = '<template id="lemon-slot-%(id)s"></template>'
+FILL = (
+    '<template id="lemon-fill-%(id)s">%(html)s</template>'
+    '<script>lemonFill("%(id)s")</script>')
+FILL_SCRIPT = (
+    '<script>function lemonFill(id) {'
+    'var slot = document.getElementById("lemon-slot-" + id);'
+    'var fill = document.getElementById("lemon-fill-" + id);'
+    'slot.parentNode.replaceChild(fill.content, slot);'
+    'fill.parentNode.removeChild(fill);}</script>')
+
+# Element ids of the views rendered outside of a request scope: a counter with
+# a random prefix (unique to the process.)
+ELEMENT_ID_PREFIX = 'l%s-' % uuid.uuid4().hex[:8]
+ELEMENT_IDS = itertools.count()
+
+# Raised when a view misses its deadline, waiting for the pool or fetching its
+# data (see `View.load`.)
+DEADLINE_ERRORS = (TimeoutError, builtins.TimeoutError)
+
+# Views without children or attributes share the same empty values.
+NO_CHILDREN = ()
+NO_ATTRS = types.MappingProxyType({})
 
 
 class View():
 
+    # Pages can contain thousands of views: the attributes are slots, which
+    # take less memory than a dictionary per view.
+    __slots__ = (
+        'path', 'name', 'template', 'children', 'api', 'data', 'params', 'id',
+        'element_id', 'html', 'tag', 'classes', 'attrs', 'future', 'kwargs',
+        'stream', 'scope', 'batched', 'timings', 'ttl', 'vary',
+        'fragment_ttl', 'fragment_vary', 'fragment_declared',
+        'cached_children', 'partial', 'signature', 'unchanged', 'expires',
+        'degraded', 'deferred')
+
     def __init__(self, path):
         """Initialize a View.
 
@@ -48,18 +109,36 @@ class View():
         """
 
         self.path = path
-        self.name = path.split('/')[-1]
-        self.children = []
+        self.name, self.template = template_path(path)
+        self.children = NO_CHILDREN
         self.api = None
         self.data = None
         self.params = dict()
         self.id = None
-        self.element_id = str(uuid.uuid4())
-        self.template = '%(path)s/%(name)s.nunjucks' % dict(
-            path=self.path, name=self.name)
+        self.future = None
+        self.kwargs = None
+        self.stream = None
+        self.scope = None
+        self.batched = False
+        self.timings = None
+        self.ttl = None
+        self.vary = None
+        self.fragment_ttl = None
+        self.fragment_vary = None
+        self.fragment_declared = False
+        self.cached_children = None
+        self.partial = False
+        self.signature = None
+        self.unchanged = False
+        self.expires = None
+        self.degraded = False
+        self.deferred = False
+        self.element_id = new_element_id()
+        self.html = ''
         self.describe()
 
-    def describe(self, tag=None, classes=None, attrs=None):
+    def describe(self, tag=None, classes=None, attrs=None, cache=None,
+                 vary=None):
         """Describe a view.
 
         The description of a view can alter the css classes appended, the
@@ -69,11 +148,19 @@ class View():
             tag (string): Valid html tag (e.g. `div`, `button`).
             classes (list): Css classes to use for this particular view.
             attrs (dict): HTML Attributes (other than classes.)
+            cache (int): Number of seconds the html of the view can be cached
+                (see `lemon.cache`.)
+            vary (list): The context keys the html of the view depends on.
         """
 
         self.tag = tag or 'div'
-        self.classes = classes or []
-        self.attrs = attrs or {}
+        self.classes = classes or NO_CHILDREN
+        self.attrs = attrs or NO_ATTRS
+
+        if cache:
+            self.fragment_ttl = cache
+            self.fragment_vary = vary
+            self.fragment_declared = True
 
     def register(self, parent=None):
         """Register a child with its parent.
@@ -92,86 +179,537 @@ class View():
             child (`View`): The child view.
         """
 
-        if not child == self:
+        if child == self:
+            return
+
+        if self.children is NO_CHILDREN:
+            self.children = [child]
+        else:
             self.children.append(child)
 
     def fetch(self, lemon, context):
         """Fetch the api to display information.
+
+        Views of the same request fetching the same endpoint with the same
+        params share a single call.
+        """
+
+        with timing.measure(self, 'fetch'):
+            if not self.scope:
+                self.data = self.load(lemon, context)
+                return
+
+            try:
+                self.data = self.scope.single_flight(
+                    cache.key(
+                        self.api.get('endpoint'), self.api.get('params')),
+                    functools.partial(self.load, lemon, context))
+            except DEADLINE_ERRORS:
+                if self.expires is not None:
+                    raise
+                # The deadline was the one of the view that fetched first.
+                self.data = self.load(lemon, context)
+
+    async def fetch_async(self, lemon, context):
+        """Fetch the api to display information (asyncio).
+
+        Handlers with an `async def get` are awaited, the others are run by the
+        lemon pool so they do not block the event loop.
         """
 
         handler = lemon.api_handler
-        self.data = handler.get(context, view_name=self.path, **self.api)
+        if not asyncio.iscoroutinefunction(handler.get):
+            loop = asyncio.get_event_loop()
+            executor = lemon.pool.executor if lemon.pool else None
+            await loop.run_in_executor(
+                executor, functools.partial(self.fetch, lemon, context))
+            return
 
-    def render_response(self, kwargs):
-        """Render the html response for the view.
+        with timing.measure(self, 'fetch'):
+            if not self.scope:
+                self.data = await self.load_async(lemon, context)
+                return
 
-        The generated response takes in ready to go html and will also use a
-        lot of the view values (id, tag, classes, attributes) to generate the
-        container of the view.
+            self.data = await self.scope.single_flight_async(
+                cache.key(self.api.get('endpoint'), self.api.get('params')),
+                functools.partial(self.load_async, lemon, context))
+
+    def load(self, lemon, context):
+        """Call the api handler.
+
+        The response comes from the lemon cache when the fetch has a ttl. The
+        deadline of the view (see `expiry`) is passed to the handlers which
+        provide a `get_within` (see `api.ApiHandler`.)
+
+        Return:
+            The response of the api handler.
+        Raise:
+            `TimeoutError`: The deadline of the view has passed.
+        """
+
+        key = self.cache_key(lemon, context)
+        if key:
+            data = lemon.api_cache.get(key)
+            if data is not None:
+                return data
+
+        handler = lemon.api_handler
+        if self.expires is not None and hasattr(handler, 'get_within'):
+            remaining = self.expires - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError()
+            data = handler.get_within(
+                context, remaining, view_name=self.path, **self.api)
+        else:
+            data = handler.get(context, view_name=self.path, **self.api)
+
+        if key and data is not None:
+            lemon.api_cache.set(key, data, self.cache_ttl(lemon))
+        return data
+
+    async def load_async(self, lemon, context):
+        """Await the api handler (asyncio).
+
+        Return:
+            The response of the api handler.
+        """
+
+        key = self.cache_key(lemon, context)
+        if key:
+            data = lemon.api_cache.get(key)
+            if data is not None:
+                return data
+
+        handler = lemon.api_handler
+        data = await handler.get(context, view_name=self.path, **self.api)
+
+        if key and data is not None:
+            lemon.api_cache.set(key, data, self.cache_ttl(lemon))
+        return data
+
+    def cache_ttl(self, lemon):
+        """Get the number of seconds the api response can be cached.
+
+        Return:
+            int: The ttl of the fetch, or `LEMON_API_CACHE_TTL`.
+        """
+
+        if self.ttl is not None:
+            return self.ttl
+        return lemon.app.config.get('LEMON_API_CACHE_TTL')
+
+    def cache_key(self, lemon, context):
+        """Get the key of the api response in the lemon cache.
+
+        Return:
+            string: The key, or `None` if the response is not cached.
+        """
+
+        if not lemon.api_cache or not self.cache_ttl(lemon):
+            return None
+
+        context = context or {}
+        return cache.key(
+            self.api.get('endpoint'),
+            self.api.get('params'),
+            {name: context.get(name) for name in self.vary or []})
+
+    def setup(self, kwargs):
+        """Set the values of the view from the render arguments.
 
         Args:
-            template (string): the html for this view.
             kwargs (dict): The params of the views
         Return:
-            String: the container of the view along with the html.
+            bool: If the data of the view needs to be fetched.
         """
 
-        lemon = kwargs.get('lemon')
-        context = kwargs.get('context')
-        data = kwargs.get('data')
-
         fetch = kwargs.get('fetch')
-        if kwargs.get('fetch'):
+        if fetch:
             self.api = dict(
                 endpoint=fetch.get('endpoint'),
                 params=fetch.get('params'))
+            self.ttl = fetch.get('ttl')
+            self.vary = fetch.get('vary')
 
+        data = kwargs.get('data')
         if data:
             self.data = data
-        elif self.api:
-            self.fetch(lemon, context)
 
         self.params = kwargs.get('params') or dict()
         self.id = kwargs.get('id')
 
-        html = lemon.app.jinja_env.get_template(self.template).render(
-            lemon=lemon,
-            context=context,
+        if kwargs.get('cache'):
+            self.fragment_ttl = kwargs.get('cache')
+            self.fragment_vary = kwargs.get('vary')
+        return bool(self.api and not data)
+
+    def template_context(self, kwargs):
+        """Variables available in the template of the view.
+
+        Args:
+            kwargs (dict): The params of the views
+        Return:
+            dict: The template variables.
+        """
+
+        return dict(
+            lemon=kwargs.get('lemon'),
+            context=kwargs.get('context'),
             params=self.params,
             api=self.api,
             data=self.data,
             parent=self)
 
-        # Wait for all children to be rendered and replace them as we get them.
-        for child in self.children:
-            child.finish()
-            html = html.replace('#%s' % child.element_id, child.html or '')
-
-        html_element = dict(
-            id=self.element_id,
-            html=jinja2.Markup(html),
-            tag_name=self.tag,
-            classes=' '.join(self.classes + [self.name]),
-            attrs=jinja2.Markup(
-                ' '.join([
-                    n + jinja2.Markup('="') +
-                    jinja2.escape(v) + jinja2.Markup('" ')
-                    for n, v in self.attrs.items()])))
+    def render_response(self, kwargs):
+        """Render the html response for the view.
+
+        The generated response takes in ready to go html and will also use a
+        lot of the view values (id, tag, classes, attributes) to generate the
+        container of the view.
+
+        Args:
+            kwargs (dict): The params of the views
+        """
+
+        lemon = kwargs.get('lemon')
+        if self.setup(kwargs):
+            self.fetch(lemon, kwargs.get('context'))
+
+        if self.reuse(lemon, kwargs):
+            return
+
+        html = self.render_template(kwargs)
+        html = self.gather(html)
+        if self.degraded:
+            # Too late, the fallback is already in place.
+            return
+
+        self.contain(html)
+        self.store_fragment(lemon, kwargs)
+        self.store_static(lemon, html)
+
+    def render_template(self, kwargs):
+        """Render the template of the view.
+
+        Args:
+            kwargs (dict): The params of the views
+        Return:
+            string: The html, with the placeholders of the children.
+        """
+
+        lemon = kwargs.get('lemon')
+        with timing.measure(self, 'template'):
+            template = lemon.app.jinja_env.get_template(self.template)
+            html = self.restore_static(lemon, template)
+            if html is not None:
+                return html
+            return template.render(**self.template_context(kwargs))
+
+    async def render_response_async(self, kwargs):
+        """Render the html response for the view (asyncio).
+
+        The fetches of all the children are running concurrently on the event
+        loop.
+
+        Args:
+            kwargs (dict): The params of the views
+        """
+
+        lemon = kwargs.get('lemon')
+        if self.setup(kwargs):
+            await self.fetch_async(lemon, kwargs.get('context'))
+
+        if self.reuse(lemon, kwargs):
+            return
+
+        with timing.measure(self, 'template'):
+            template = lemon.async_env.get_template(self.template)
+            html = await template.render_async(
+                **self.template_context(kwargs))
+
+        with timing.measure(self, 'children'):
+            await asyncio.gather(*[
+                child.finish_async() for child in self.children])
+        self.partial = self.incomplete()
+        with timing.measure(self, 'stitch'):
+            html = stitch(html, self.children)
+
+        if self.degraded:
+            return
+
+        self.contain(html)
+        self.store_fragment(lemon, kwargs)
+
+    def gather(self, html):
+        """Wait for all the children to be rendered and put them in place.
+
+        When the view is streamed, the children that are still being rendered
+        are not waited for: a slot is left in their place, and they are
+        flushed later on (see `stream_main_view`.)
+
+        Args:
+            html (string): The html of the view, with the placeholders.
+        Return:
+            string: The html of the view, with the children.
+        """
+
+        slots = []
+        with timing.measure(self, 'children'):
+            for child in self.children:
+                if (self.stream is not None and child.future and
+                        not child.future.done()):
+                    slots.append(child)
+                    self.stream.append(child)
+                else:
+                    child.finish()
+
+        self.partial = bool(slots) or self.incomplete()
+        with timing.measure(self, 'stitch'):
+            return stitch(html, self.children, slots)
+
+    def incomplete(self):
+        """Check if the html of a child is only meaningful to this request:
+        the placeholder of a view the client already has (see `keep`), or the
+        fallback of a view that missed its deadline (see `degrade`.) The html
+        of the view is then not cached.
+
+        Return:
+            bool: If a child (or one of its descendants) is incomplete.
+        """
+
+        return any(
+            child.partial or child.unchanged or child.degraded
+            for child in self.children)
+
+    def reuse(self, lemon, kwargs):
+        """Reuse html rendered previously instead of rendering the view.
+
+        Either the client already has the html of the view (see `keep`), or
+        the html is in the fragment cache.
+
+        Args:
+            lemon (Lemon): The lemon instance.
+            kwargs (dict): The params of the views
+        Return:
+            bool: If the view does not need to be rendered.
+        """
+
+        return self.keep() or self.restore_fragment(lemon, kwargs)
+
+    def restore_static(self, lemon, template):
+        """Restore the html of a static view (see `templates.is_static`.)
+
+        Static views are rendered once: their html and description are kept
+        until their template is reloaded, only the element id of their
+        container changes.
+
+        Args:
+            lemon (Lemon): The lemon instance.
+            template (`jinja2.Template`): The template of the view.
+        Return:
+            string: The html of the view, or `None`.
+        """
+
+        if self.api or not lemon or lemon.static_views is None:
+            return None
+
+        entry = lemon.static_views.get(self.template)
+        if not entry or entry[0] is not template:
+            static = templates.is_static(lemon.app.jinja_env, self.template)
+            lemon.static_views[self.template] = (template, static, None)
+            return None
+
+        _, static, description = entry
+        if not static or not description:
+            return None
+
+        html, tag, classes, attrs = description
+        self.describe(tag, classes, attrs)
+        return html
+
+    def store_static(self, lemon, html):
+        """Keep the html of a static view.
+
+        Args:
+            lemon (Lemon): The lemon instance.
+            html (string): The html of the view (without its container.)
+        """
+
+        if self.api or not lemon or lemon.static_views is None:
+            return
+
+        entry = lemon.static_views.get(self.template)
+        if entry and entry[1] and not entry[2]:
+            lemon.static_views[self.template] = (entry[0], True, (
+                html, self.tag, self.classes, self.attrs))
+
+    def fingerprint(self):
+        """Compute the fingerprint of the inputs of the view.
+
+        Two views with the same path, params, fetch and data have the same
+        fingerprint (the html of the view might still depend on the context.)
+
+        Return:
+            string: The fingerprint.
+        """
+
+        if not self.signature:
+            value = json.dumps(
+                [self.path, self.params, self.api, self.data],
+                sort_keys=True, separators=(',', ':'), default=str)
+            self.signature = hashlib.sha1(value.encode('utf-8')).hexdigest()
+        return self.signature
+
+    def keep(self):
+        """Keep the html the client already has for this view.
+
+        When the fingerprint of the view is one the client has (see
+        `scope.Scope.add_fingerprints`), neither the view nor its children are
+        rendered: the view is left empty, with the element id of the client
+        element and a `data-lemon-unchanged` attribute.
+
+        Return:
+            bool: If the view is unchanged.
+        """
+
+        if not self.scope or not self.scope.fingerprints:
+            return False
+
+        element_id = self.scope.take_fingerprint(self.fingerprint())
+        if not element_id:
+            return False
+
+        # The placeholder of the view keeps its element id, the client keeps
+        # its own.
+        self.unchanged = element_id
+        self.html = jinja2.Markup(
+            '<%(tag)s id="%(id)s" data-lemon-unchanged></%(tag)s>') % dict(
+                tag=self.tag, id=element_id)
+        return True
+
+    def fragment_key(self, lemon, kwargs):
+        """Get the key of the html of the view in the fragment cache.
+
+        Args:
+            lemon (Lemon): The lemon instance.
+            kwargs (dict): The params of the views
+        Return:
+            string: The key, or `None` if the html is not cached.
+        """
+
+        fragments = lemon.fragment_cache if lemon else None
+        if not fragments:
+            return None
+
+        if not self.fragment_ttl:
+            declaration = fragments.declaration(self.path)
+            if not declaration:
+                return None
+            self.fragment_ttl, self.fragment_vary = declaration
+
+        context = kwargs.get('context') or {}
+        return fragments.key(
+            self.path, self.params, self.data,
+            {name: context.get(name) for name in self.fragment_vary or []})
+
+    def restore_fragment(self, lemon, kwargs):
+        """Restore the html of the view from the fragment cache.
+
+        The element ids of the view and of its descendants are replaced with
+        new ones, so they remain unique within the page.
+
+        Args:
+            lemon (Lemon): The lemon instance.
+            kwargs (dict): The params of the views
+        Return:
+            bool: If the html has been restored.
+        """
+
+        key = self.fragment_key(lemon, kwargs)
+        entry = lemon.fragment_cache.get(key) if key else None
+        if not entry or not lemon.fragment_cache.current(entry['paths']):
+            return False
+
+        segments = list(entry['segments'])
+        create = self.scope.new_element_id if self.scope else new_element_id
+        ids = {element_id: create() for element_id in segments[1::2]}
+        ids[entry['element_id']] = self.element_id
+        for index in range(1, len(segments), 2):
+            segments[index] = ids[segments[index]]
+
+        self.html = jinja2.Markup(''.join(segments))
+        self.cached_children = rename(entry['children'], ids)
+        return True
+
+    def store_fragment(self, lemon, kwargs):
+        """Store the html of the view in the fragment cache.
+
+        Args:
+            lemon (Lemon): The lemon instance.
+            kwargs (dict): The params of the views
+        """
+
+        if self.partial:
+            return
+
+        key = self.fragment_key(lemon, kwargs)
+        if not key:
+            return
+
+        fragments = lemon.fragment_cache
+        if self.fragment_declared:
+            fragments.declare(self.path, self.fragment_ttl, self.fragment_vary)
+
+        children = self.to_dict().get('children')
+        ids = [self.element_id]
+        paths = {self.path: fragments.generations.get(self.path, 0)}
+        nodes = list(children)
+        while nodes:
+            node = nodes.pop()
+            ids.append(node.get('element_id'))
+            paths[node.get('path')] = fragments.generations.get(
+                node.get('path'), 0)
+            nodes.extend(node.get('children'))
+
+        # Whole ids only: `v…-1` must not match the start of `v…-13`.
+        pattern = r'(?<![\w-])(%s)(?!\d)' % '|'.join(
+            re.escape(i) for i in ids)
+        fragments.set(key, dict(
+            segments=re.split(pattern, self.html),
+            element_id=self.element_id,
+            children=children,
+            paths=paths), self.fragment_ttl)
+
+    def contain(self, html):
+        """Wrap the html of the view in its container.
+
+        The container uses the view values (id, tag, classes, attributes) and
+        makes it easier for javascript to identify the view.
+
+        Args:
+            html (string): the html for this view.
+        """
+
+        # The values are escaped one by one and formatted in a plain string,
+        # which is marked safe once.
+        escape = jinja2.escape
+        tag = escape(self.tag)
+        attrs = ' '.join([
+            '%s="%s" ' % (escape(name), escape(value))
+            for name, value in self.attrs.items()])
+        element = '<%s id="%s" class="View %s" %s>' % (
+            tag, escape(self.element_id),
+            escape(' '.join(list(self.classes) + [self.name])), attrs)
 
         if self.tag not in ['img', 'input']:
-            self.html = jinja2.Markup(
-                '<%(tag_name)s id="%(id)s" class="View %(classes)s" ' +
-                '%(attrs)s>%(html)s</%(tag_name)s>') % html_element
-        else:
-            self.html = jinja2.Markup(
-                '<%(tag_name)s id="%(id)s" class="View %(classes)s" ' +
-                '%(attrs)s>') % html_element
+            element = '%s%s</%s>' % (element, html, tag)
+        self.html = jinja2.Markup(element)
 
     def render(self, **kwargs):
         """Render a view (async).
 
-        The view is rendered in a thread, which allows other child views to be
-        rendered at the same time.
+        Views that fetch data are rendered by the lemon pool, which allows
+        other child views to be rendered at the same time.
 
         Args:
             kwargs (dict): Contains the informations that are allowing us to
@@ -183,19 +721,229 @@ class View():
 
         self.register(kwargs.get('parent') or None)
         self.html = ''
+        self.stream = kwargs.get('stream')
+        self.scope = kwargs.get('scope')
+        if self.scope:
+            self.element_id = self.scope.new_element_id()
+            if self.scope.timings is not None:
+                self.timings = {}
 
-        # Create the thread.
-        if kwargs.get('fetch'):
-            thread = Thread(
-                target=self.render_response, args=(kwargs,))
-            thread.start()
-            self.finish = thread.join
-            return '#%(id)s' % dict(id=self.element_id)
+        if kwargs.get('defer'):
+            self.defer(kwargs)
+            return self.html
+
+        lemon = kwargs.get('lemon')
+        if kwargs.get('fetch') and self.scope and batching(lemon):
+            if self.setup(kwargs):
+                # Rendered with the other views of its level (see `finish`.)
+                self.batched = True
+                self.stream = None
+                self.kwargs = kwargs
+                self.scope.add_batch(self)
+                return placeholder(self.element_id)
+
+        if kwargs.get('fetch') and lemon and lemon.pool:
+            # Known before the pool starts the view (see `load`.)
+            self.expires = self.expiry(lemon, kwargs.get('fetch'))
+            self.future = lemon.pool.submit(self.render_response, kwargs)
+            if self.future:
+                # Views rendered in the background are flushed as a whole.
+                self.stream = None
+                self.kwargs = kwargs
+                return placeholder(self.element_id)
 
-        self.finish = lambda: None
         self.render_response(kwargs)
         return self.html
 
+    def defer(self, kwargs):
+        """Defer a view: the view is neither fetched nor rendered, the client
+        loads it later (see `lazy`.)
+
+        Args:
+            kwargs (dict): The params of the view.
+        """
+
+        self.setup(kwargs)
+        self.deferred = True
+        self.lazy(kwargs)
+
+    def finish(self):
+        """Wait for the view to be rendered.
+
+        If the pool has not started rendering the view yet, it is rendered in
+        the current thread instead: a view waiting on its children never holds
+        a worker that its children would need.
+
+        Batched views are rendered with all the views queued with them: the
+        data of the whole batch is fetched with a single call.
+
+        Views with a deadline (see `expiry`) are waited for until their
+        deadline, and degraded if they miss it (see `degrade`.) When they are
+        rendered in the current thread, the deadline applies to their fetch
+        (see `load`.) The deadline is not enforced for batched views.
+        """
+
+        if self.batched:
+            render_batch(self.scope.pop_batch())
+            return
+
+        future, self.future = self.future, None
+        if not future:
+            return
+
+        if self.expires is None:
+            if future.cancel():
+                self.render_response(self.kwargs)
+            else:
+                future.result()
+            return
+
+        try:
+            if future.cancel():
+                self.render_response(self.kwargs)
+            else:
+                future.result(
+                    timeout=max(0, self.expires - time.monotonic()))
+        except DEADLINE_ERRORS:
+            future.cancel()
+            self.degrade()
+
+    async def render_async(self, **kwargs):
+        """Render a view (asyncio).
+
+        Views that fetch data are scheduled as tasks on the event loop, so all
+        the fetches of a template are in flight at the same time.
+
+        Args:
+            kwargs (dict): Contains the informations that are allowing us to
+                draw this specific view.
+        Return:
+            string: The id of the view (which will later on be replaced with
+                its html.)
+        """
+
+        self.register(kwargs.get('parent') or None)
+        self.html = ''
+        self.scope = kwargs.get('scope')
+        if self.scope:
+            self.element_id = self.scope.new_element_id()
+            if self.scope.timings is not None:
+                self.timings = {}
+
+        if kwargs.get('defer'):
+            self.defer(kwargs)
+            return self.html
+
+        if kwargs.get('fetch'):
+            self.expires = self.expiry(
+                kwargs.get('lemon'), kwargs.get('fetch'))
+            self.future = asyncio.ensure_future(
+                self.render_response_async(kwargs))
+            self.kwargs = kwargs
+            return placeholder(self.element_id)
+
+        await self.render_response_async(kwargs)
+        return self.html
+
+    async def finish_async(self):
+        """Wait for the view to be rendered (asyncio).
+        """
+
+        future, self.future = self.future, None
+        if not future:
+            return
+
+        if self.expires is None:
+            await future
+            return
+
+        try:
+            await asyncio.wait_for(
+                future, max(0, self.expires - time.monotonic()))
+        except (asyncio.TimeoutError,) + DEADLINE_ERRORS:
+            self.degrade()
+
+    def expiry(self, lemon, fetch):
+        """Get the time by which the view must be rendered.
+
+        It is the earliest of the deadline of the request (see
+        `scope.Scope.deadline`) and the timeout of the fetch (the `timeout`
+        of the fetch, or `LEMON_FETCH_TIMEOUT`.)
+
+        Args:
+            lemon (Lemon): The lemon instance.
+            fetch (dict): The fetch of the view.
+        Return:
+            float: The time (see `time.monotonic`), or `None`.
+        """
+
+        deadline = self.scope.deadline if self.scope else None
+        timeout = (fetch or {}).get('timeout') or (
+            lemon and lemon.app.config.get('LEMON_FETCH_TIMEOUT'))
+        if not timeout:
+            return deadline
+
+        expires = time.monotonic() + timeout
+        return min(deadline, expires) if deadline else expires
+
+    def degrade(self):
+        """Render the fallback of a view that missed its deadline.
+
+        The `fallback` block of the template of the view is rendered alone
+        (without data), e.g.:
+
+        ```
+        {% if data %}
+          ...
+        {% else %}
+          {% block fallback %}Not available{% endblock %}
+        {% endif %}
+        ```
+
+        Views without a fallback block are left empty, so the client can load
+        them later (see `lazy`.) Degraded views are listed in the scope of
+        the request.
+        """
+
+        self.degraded = True
+        if self.scope:
+            self.scope.degrade(self)
+
+        kwargs = self.kwargs
+        template = kwargs.get('lemon').app.jinja_env.get_template(
+            self.template)
+        block = template.blocks.get('fallback')
+        if block:
+            context = template.new_context(self.template_context(
+                dict(kwargs, fetch=None)))
+            self.contain(''.join(block(context)))
+            return
+
+        self.lazy(kwargs)
+
+    def lazy(self, kwargs):
+        """Leave the view empty, for the client to load it later.
+
+        The container of the view has its description (path, params, fetch,
+        id and signed token) in a `data-lemon-lazy` attribute. See
+        `lemon.defer`.
+
+        Args:
+            kwargs (dict): The params of the view.
+        """
+
+        description = dict(
+            path=self.path,
+            params=kwargs.get('params') or {},
+            fetch=kwargs.get('fetch'),
+            id=kwargs.get('id'))
+        token = defer.sign(kwargs.get('lemon'), description)
+
+        self.attrs = dict(self.attrs, **{
+            'data-lemon-lazy': json.dumps(
+                dict(description, token=token), default=str)})
+        self.contain('')
+
     def to_dict(self):
         """Render the dictionary representation of this object.
 
@@ -203,14 +951,38 @@ class View():
             Dict: The dictionary that represents the view.
         """
 
-        return dict(
+        tree = self.node()
+        tree.update(children=(
+            self.cached_children if self.cached_children is not None
+            else [child.to_dict() for child in self.children]))
+        return tree
+
+    def node(self):
+        """Render the dictionary representation of this view, without its
+        children (see `lemon.serialize`.)
+
+        Return:
+            Dict: The dictionary that represents the view.
+        """
+
+        node = dict(
             fetch=self.api,
-            children=[child.to_dict() for child in self.children],
             id=self.id,
             element_id=self.element_id,
+            fingerprint=self.fingerprint(),
             params=self.params,
             path=self.path)
 
+        if self.unchanged:
+            node.update(element_id=self.unchanged, unchanged=True)
+        if self.timings is not None:
+            node.update(timings=timing.milliseconds(self.timings))
+        if self.degraded:
+            node.update(degraded=True)
+        if self.deferred:
+            node.update(deferred=True)
+        return node
+
 
 class MainView(View):
     """Main View
@@ -220,6 +992,8 @@ class MainView(View):
     to be rendered.
     """
 
+    __slots__ = ()
+
     def __init__(self, path):
         super().__init__(path)
         MainView.instance = self
@@ -228,13 +1002,24 @@ class MainView(View):
         if lemon:
             kwargs.update(routes=lemon.route_views, lemon=lemon)
 
-        render = current_app.jinja_env.get_template(
-            self.template).render(**kwargs)
+        with timing.measure(self, 'template'):
+            render = current_app.jinja_env.get_template(
+                self.template).render(**kwargs)
+        return self.gather(render)
+
+    async def render_async(self, lemon=None, **kwargs):
+        if lemon:
+            kwargs.update(routes=lemon.route_views, lemon=lemon)
+
+        with timing.measure(self, 'template'):
+            render = await lemon.async_env.get_template(
+                self.template).render_async(**kwargs)
 
-        for child in self.children:
-            child.finish()
-            render = render.replace('#%s' % child.element_id, child.html)
-        return render
+        with timing.measure(self, 'children'):
+            await asyncio.gather(*[
+                child.finish_async() for child in self.children])
+        with timing.measure(self, 'stitch'):
+            return stitch(render, self.children)
 
 
 def render_main_view(lemon, primary_view, **kwargs):
@@ -243,24 +1028,33 @@ def render_main_view(lemon, primary_view, **kwargs):
     Args:
         lemon (Lemon): The lemon instance.
         primary_view (string): Name of the primary view.
-        kwargs (dict): Properties to pass to the primary view.
+        kwargs (dict): Properties to pass to the primary view, and the
+            `scope.Scope` of the request.
 
     Return:
         `jinja2.Markup`: The html of the module.
     """
 
     primary_view = View(primary_view)
+    request_scope = kwargs.get('scope') or scope.Scope()
     context = lemon.context
+    prefetch(lemon, primary_view, kwargs, context, request_scope)
     primary_view.render(
         id='primary_view',
         lemon=lemon,
         context=context,
         fetch=kwargs.get('fetch'),
         params=kwargs.get('params'),
-        data=kwargs.get('data'))
+        data=kwargs.get('data'),
+        cache=kwargs.get('cache'),
+        defer=kwargs.get('defer'),
+        scope=request_scope)
 
     main_view = MainView(current_app.config.get('LEMON_APP_VIEW'))
     main_view.add_child(primary_view)
+    main_view.scope = request_scope
+    if request_scope.timings is not None:
+        main_view.timings = {}
     primary_view.finish()
 
     html = main_view.render(
@@ -269,9 +1063,361 @@ def render_main_view(lemon, primary_view, **kwargs):
         parent=main_view,
         primary_view=primary_view.html)
 
+    if request_scope.timings is not None:
+        request_scope.timings.add_context(context)
+    return html
+
+
+def stream_main_view(lemon, primary_view, **kwargs):
+    """Stream the main view.
+
+    The shell of the application is sent with all the views that are already
+    rendered. Views still fetching their data are left as empty slots and are
+    flushed as soon as they are ready, in the order they complete. A small
+    script swaps each of them into its slot.
+
+    Args:
+        lemon (Lemon): The lemon instance.
+        primary_view (string): Name of the primary view.
+        kwargs (dict): Properties to pass to the primary view, and the
+            `scope.Scope` of the request.
+
+    Return:
+        generator: The chunks of the page (within the request context.)
+    """
+
+    pending = []
+    primary_view = View(primary_view)
+    request_scope = kwargs.get('scope') or scope.Scope()
+    context = lemon.context
+    prefetch(lemon, primary_view, kwargs, context, request_scope)
+
+    # The placeholder of a primary view still fetching its data: the shell
+    # decides whether it is streamed once rendered (see `gather`.)
+    primary_html = primary_view.render(
+        id='primary_view',
+        lemon=lemon,
+        context=context,
+        fetch=kwargs.get('fetch'),
+        params=kwargs.get('params'),
+        data=kwargs.get('data'),
+        cache=kwargs.get('cache'),
+        defer=kwargs.get('defer'),
+        scope=request_scope,
+        stream=pending)
+
+    main_view = MainView(current_app.config.get('LEMON_APP_VIEW'))
+    main_view.add_child(primary_view)
+    main_view.scope = request_scope
+    if request_scope.timings is not None:
+        main_view.timings = {}
+    main_view.stream = pending
+
+    html = main_view.render(
+        lemon=lemon,
+        context=context,
+        parent=main_view,
+        primary_view=primary_html)
+
+    def generate():
+        yield html
+        if not pending:
+            return
+
+        yield FILL_SCRIPT
+        views = {child.future: child for child in pending}
+        expires = [child.expires for child in pending]
+        timeout = None
+        if None not in expires:
+            timeout = max(0, max(expires) - time.monotonic())
+
+        try:
+            for future in as_completed(views, timeout=timeout):
+                child = views.pop(future)
+                child.finish()
+                yield fill(child)
+        except TimeoutError:
+            # The views left have all missed their deadline.
+            for child in views.values():
+                child.finish()
+                yield fill(child)
+
+    return flask.stream_with_context(generate())
+
+
+async def render_main_view_async(lemon, primary_view, **kwargs):
+    """Render the main view (asyncio).
+
+    Does not require the flask application context, and can be awaited from
+    an asgi server. Wsgi applications use `aio.run`.
+
+    Args:
+        lemon (Lemon): The lemon instance.
+        primary_view (string): Name of the primary view.
+        kwargs (dict): Properties to pass to the primary view, and the
+            `scope.Scope` of the request.
+
+    Return:
+        `jinja2.Markup`: The html of the module.
+    """
+
+    primary_view = View(primary_view)
+    request_scope = kwargs.get('scope') or scope.Scope()
+    context = lemon.context
+    await primary_view.render_async(
+        id='primary_view',
+        lemon=lemon,
+        context=context,
+        fetch=kwargs.get('fetch'),
+        params=kwargs.get('params'),
+        data=kwargs.get('data'),
+        cache=kwargs.get('cache'),
+        defer=kwargs.get('defer'),
+        scope=request_scope)
+
+    main_view = MainView(lemon.app.config.get('LEMON_APP_VIEW'))
+    main_view.add_child(primary_view)
+    main_view.scope = request_scope
+    if request_scope.timings is not None:
+        main_view.timings = {}
+    await primary_view.finish_async()
+
+    html = await main_view.render_async(
+        lemon=lemon,
+        context=context,
+        parent=main_view,
+        primary_view=primary_view.html)
+
+    if request_scope.timings is not None:
+        request_scope.timings.add_context(context)
     return html
 
 
+def prefetch(lemon, primary_view, kwargs, context, request_scope):
+    """Start the fetches of the children of a view known before rendering
+    (see `lemon.graph`.)
+
+    The fetches are run by the lemon pool, the views find their data in
+    flight in the scope of the request.
+
+    Args:
+        lemon (Lemon): The lemon instance.
+        primary_view (`View`): The view about to be rendered.
+        kwargs (dict): The params of the view.
+        context (dict): The context of the request.
+        request_scope (`scope.Scope`): The scope of the request.
+    """
+
+    if not lemon.graph or not lemon.pool or kwargs.get('defer'):
+        return
+
+    fetches = graph.prefetch(
+        lemon.graph, primary_view.path, kwargs.get('params') or {},
+        template_path)
+    for path, fetch in fetches:
+        child = View(path)
+        child.scope = request_scope
+        child.setup(dict(fetch=fetch))
+        if not lemon.pool.submit(child.fetch, lemon, context):
+            return
+
+
+def batching(lemon):
+    """Check if the fetches of a lemon instance are batched.
+
+    Args:
+        lemon (Lemon): The lemon instance.
+    Return:
+        bool: If `LEMON_FETCH_BATCH` is set and the api handler provides a
+            `get_many`.
+    """
+
+    return bool(
+        lemon and lemon.app.config.get('LEMON_FETCH_BATCH') and
+        hasattr(lemon.api_handler, 'get_many'))
+
+
+def render_batch(views):
+    """Render views fetching their data in a batch.
+
+    The data of all the views is fetched with a single call to `get_many`
+    (cached responses and duplicate fetches are left out.) Fetches already in
+    flight in the scope of the request (e.g. prefetched, see `prefetch`) are
+    waited for instead, and the fetches of the batch are themselves in
+    flight for the other views of the request. The templates of
+    all the views are rendered before any of them waits for its children, so
+    the children of the whole batch are themselves queued in the next batch.
+
+    Args:
+        views (list): The batched views.
+    """
+
+    if not views:
+        return
+
+    lemon = views[0].kwargs.get('lemon')
+    context = views[0].kwargs.get('context')
+    request_scope = views[0].scope
+
+    pending = {}
+    futures = {}
+    in_flight = []
+    for child in views:
+        child.batched = False
+        key = child.cache_key(lemon, context)
+        data = lemon.api_cache.get(key) if key else None
+        if data is not None:
+            child.data = data
+            continue
+
+        flight = cache.key(child.api.get('endpoint'), child.api.get('params'))
+        if flight not in pending:
+            future, owner = request_scope.claim(flight)
+            if not owner:
+                in_flight.append((child, future))
+                continue
+            futures[flight] = future
+        pending.setdefault(flight, []).append(child)
+
+    if pending:
+        groups = list(pending.values())
+        try:
+            responses = lemon.api_handler.get_many(context, [
+                dict(view_name=group[0].path, **group[0].api)
+                for group in groups])
+        except BaseException as error:
+            for future in futures.values():
+                future.set_exception(error)
+            raise
+
+        for (flight, group), data in zip(pending.items(), responses):
+            futures[flight].set_result(data)
+            for child in group:
+                child.data = data
+
+            key = group[0].cache_key(lemon, context)
+            if key and data is not None:
+                lemon.api_cache.set(key, data, group[0].cache_ttl(lemon))
+
+    for child, future in in_flight:
+        child.data = future.result()
+
+    views = [
+        child for child in views
+        if not child.reuse(lemon, child.kwargs)]
+    html = [child.render_template(child.kwargs) for child in views]
+    for child, child_html in zip(views, html):
+        child.contain(child.gather(child_html))
+        child.store_fragment(lemon, child.kwargs)
+
+
+def new_element_id():
+    """Create a unique element id (see `scope.Scope.new_element_id` for the
+    views rendered within a request.)
+
+    Return:
+        string: The element id.
+    """
+
+    return '%s%d' % (ELEMENT_ID_PREFIX, next(ELEMENT_IDS))
+
+
+@functools.lru_cache(maxsize=1024)
+def template_path(path):
+    """Get the name and the template of a view.
+
+    The strings are interned: all the views with the same path share them.
+
+    Args:
+        path (string): The path of the view.
+    Return:
+        tuple: The name and the template.
+    """
+
+    name = path.split('/')[-1]
+    return sys.intern(name), sys.intern('%s/%s.nunjucks' % (path, name))
+
+
+def rename(tree, ids):
+    """Rename the element ids of a tree (see `View.to_dict`.)
+
+    Args:
+        tree (list): The dictionary representations of the views.
+        ids (dict): The new element id of each element id.
+    Return:
+        list: The renamed tree.
+    """
+
+    return [
+        dict(node, element_id=ids.get(node.get('element_id')),
+             children=rename(node.get('children'), ids))
+        for node in tree]
+
+
+def placeholder(element_id):
+    """Create the placeholder of a view.
+
+    Args:
+        element_id (string): The element id of the view.
+    Return:
+        `jinja2.Markup`: The placeholder.
+    """
+
+    return jinja2.Markup(PLACEHOLDER % element_id)
+
+
+def stitch(html, children, slots=None):
+    """Replace the placeholders with the html of the children.
+
+    The html is split once on the placeholders and the segments are joined
+    once, regardless of the number of children.
+
+    Args:
+        html (string): The html containing the placeholders.
+        children (list): The views (already rendered.)
+        slots (list): The views that are streamed later on.
+    Return:
+        string: The html with the children.
+    """
+
+    segments = PLACEHOLDER_PATTERN.split(html)
+    if len(segments) == 1:
+        return html
+
+    views = {child.element_id: child for child in children}
+    for index in range(1, len(segments), 2):
+        child = views.get(segments[index])
+        if slots and child in slots:
+            segments[index] = slot(child.element_id)
+        else:
+            segments[index] = child and child.html or ''
+    return ''.join(segments)
+
+
+def slot(element_id):
+    """Create the slot of a streamed view.
+
+    Args:
+        element_id (string): The element id of the view.
+    Return:
+        `jinja2.Markup`: The slot.
+    """
+
+    return jinja2.Markup(SLOT % dict(id=element_id))
+
+
+def fill(view):
+    """Create the chunk that fills the slot of a streamed view.
+
+    Args:
+        view (`View`): The rendered view.
+    Return:
+        `jinja2.Markup`: The chunk.
+    """
+
+    return jinja2.Markup(FILL) % dict(id=view.element_id, html=view.html)
+
+
 def render(view_name, **kwargs):
     """Render a view.
 
@@ -314,13 +1460,32 @@ def jinja2_render(context, view_name, **kwargs):
         `jinja2.Markup`: the HTML of the view.
     """
 
+    parent = context.get('parent')
     kwargs.update(
         context=context.get('context'),
         lemon=context.get('lemon'),
-        parent=context.get('parent'))
+        parent=parent,
+        scope=getattr(parent, 'scope', None),
+        stream=getattr(parent, 'stream', None))
     return render(view_name, **kwargs)
 
 
+@jinja2.contextfunction
+async def jinja2_render_async(context, view_name, **kwargs):
+    """Context-aware Jinja2 Helper (asyncio).
+
+    Same as `jinja2_render`, for the environment with async enabled.
+    """
+
+    parent = context.get('parent')
+    kwargs.update(
+        context=context.get('context'),
+        lemon=context.get('lemon'),
+        parent=parent,
+        scope=getattr(parent, 'scope', None))
+    return await View(view_name).render_async(**kwargs)
+
+
 def jsonify(obj):
     """Turns an object into a json.
 
@@ -331,13 +1496,14 @@ def jsonify(obj):
 
 
 @jinja2.contextfunction
-def describe(context, tag=None, classes=None, attrs=None):
+def describe(context, tag=None, classes=None, attrs=None, cache=None,
+             vary=None):
     """Describe a view.
 
     Proxy for View.describe
     """
 
-    context.get('parent').describe(tag, classes, attrs)
+    context.get('parent').describe(tag, classes, attrs, cache, vary)
     return ''
 
 
@@ -345,19 +1511,36 @@ def create_environment(lemon):
     """Create the jinja2 environmnet for a lemon instance.
 
     Each lemon instance has its own jinja2 environment. This environment is
-    kept in memory for faster access.
+    kept in memory for faster access. A second environment, with async
+    enabled, is used to render the views on an event loop.
     """
 
-    view_path = lemon.app.config['LEMON_VIEW_PATH']
+    config = lemon.app.config
+    view_path = config['LEMON_VIEW_PATH']
     view_loader = jinja2.FileSystemLoader([view_path])
-
-    lemon.app.jinja_env = jinja2.Environment(
-        loader=view_loader,
-        autoescape=True)
-
-    lemon.app.jinja_env.globals.update(
+    view_globals = dict(
         lemon=lemon,
         describe=describe,
-        view=jinja2_render,
         Api=api.jinja2,
         jsonify=jsonify)
+    cache_size = config.get('LEMON_TEMPLATE_CACHE_SIZE', 400)
+    bytecode_path = config.get('LEMON_BYTECODE_CACHE')
+
+    auto_reload = config.get('LEMON_AUTO_RELOAD', True)
+
+    lemon.app.jinja_env = jinja2.Environment(
+        loader=view_loader,
+        autoescape=True,
+        auto_reload=auto_reload,
+        cache_size=cache_size,
+        bytecode_cache=templates.bytecode_cache(bytecode_path, 'sync'))
+    lemon.app.jinja_env.globals.update(view_globals, view=jinja2_render)
+
+    lemon.async_env = jinja2.Environment(
+        loader=view_loader,
+        autoescape=True,
+        enable_async=True,
+        auto_reload=auto_reload,
+        cache_size=cache_size,
+        bytecode_cache=templates.bytecode_cache(bytecode_path, 'async'))
+    lemon.async_env.globals.update(view_globals, view=jinja2_render_async)
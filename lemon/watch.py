@@ -0,0 +1,139 @@
+"""
+Watch
+=====
+
+By default, jinja2 checks if a template changed on disk each time it is used
+(one `stat` per view per request.) With `LEMON_AUTO_RELOAD` disabled, the
+templates are never checked: they are reloaded with `Lemon.reload_views`,
+either called explicitly (e.g. after a deploy) or by a `Watcher` polling the
+views every `LEMON_WATCH_INTERVAL` seconds.
+
+Only the templates which changed are evicted, with everything derived from
+them (the fragments of the view and its dependencies, see `lemon.graph`.)
+
+Configuration
+-------------
+
+- `LEMON_AUTO_RELOAD`: Check the templates on each use (default: True.)
+- `LEMON_WATCH_INTERVAL`: Number of seconds between two scans of the views
+  (default: None, the views are not watched.)
+"""
+
+import os
+import os.path
+import threading
+
+
+class Watcher():
+
+    def __init__(self, directory, interval, callback):
+        """Initialize the watcher of a directory of views.
+
+        Args:
+            directory (string): The directory.
+            interval (float): Number of seconds between two scans.
+            callback (Function): Called with the names of the templates
+                changed (added, modified or removed.)
+        """
+
+        self.directory = directory
+        self.interval = interval
+        self.callback = callback
+        self.stopped = threading.Event()
+        self.thread = None
+        self.files = self.scan()
+
+    def scan(self):
+        """List the templates.
+
+        Return:
+            dict: The modification time and size of each template (by
+                name.)
+        """
+
+        files = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.nunjucks'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                template = os.path.relpath(path, self.directory)
+                files[template.replace(os.sep, '/')] = (
+                    stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def check(self):
+        """Scan the templates and report the changes.
+
+        Return:
+            list: The names of the templates changed.
+        """
+
+        files = self.scan()
+        changed = sorted(
+            name for name in set(files) | set(self.files)
+            if files.get(name) != self.files.get(name))
+        self.files = files
+        if changed:
+            self.callback(changed)
+        return changed
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def start(self):
+        """Start watching in a background thread.
+        """
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop watching.
+        """
+
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+
+def evict(env, names=None):
+    """Evict templates from the cache of an environment.
+
+    Args:
+        env (`jinja2.Environment`): The environment.
+        names (list): The names of the templates (default: all of them.)
+    """
+
+    if env is None or env.cache is None:
+        return
+
+    if names is None:
+        env.cache.clear()
+        return
+
+    names = set(names)
+    for key in list(env.cache.keys()):
+        if key[1] in names:
+            try:
+                del env.cache[key]
+            except KeyError:
+                pass
+
+
+def view_path(name):
+    """Get the path of the view of a template.
+
+    Args:
+        name (string): The name of the template (e.g. `Nav/Nav.nunjucks`.)
+    Return:
+        string: The path of the view (e.g. `Nav`.)
+    """
+
+    return name.rsplit('/', 1)[0] if '/' in name else name
@@ -40,9 +40,13 @@ setup(
     zip_safe=False,
     include_package_data=True,
     platforms='any',
+    python_requires='>=3.7',
     install_requires=[
         'Flask',
         'requests'],
+    extras_require={
+        'orjson': ['orjson'],
+        'brotli': ['brotli']},
     tests_require=[
         'pytest-cov'],
     cmdclass = {
@@ -1,5 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
 from unittest.mock import MagicMock
+import gzip
+import json
+import pytest
 import requests
+import threading
+import time
 
 from tests.fixtures import fixture_server
 from lemon import api
@@ -14,3 +22,112 @@ def test_jinja2_endpoint(monkeypatch):
     res = api.jinja2(endpoint, params=params)
     assert res.get('endpoint') is endpoint
     assert res.get('params') is params
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.clients.add(self.client_address)
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+
+        time.sleep(server.delay)
+        body = json.dumps(dict(path=self.path)).encode('utf-8')
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            body = gzip.compress(body)
+
+        with server.lock:
+            server.active -= 1
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.lock = threading.Lock()
+    server.clients = set()
+    server.active = 0
+    server.peak = 0
+    server.delay = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_get(server):
+    """Connections are kept alive, and the gzipped json is decoded.
+    """
+
+    handler = api.ApiHandler('http://127.0.0.1:%d/api/' % server.server_port)
+    for index in range(3):
+        data = handler.get(
+            {}, view_name='View', endpoint='/items/', params=dict(id=index))
+        assert data == dict(path='/api/items/?id=%d' % index)
+
+    assert len(server.clients) == 1
+    handler.close()
+
+
+def test_max_per_host(server):
+    """The requests sent at the same time to a host are capped.
+    """
+
+    server.delay = 0.05
+    handler = api.ApiHandler(
+        'http://127.0.0.1:%d' % server.server_port, max_per_host=2)
+    with ThreadPoolExecutor(6) as executor:
+        list(executor.map(
+            lambda index: handler.get({}, endpoint='/%d/' % index),
+            range(6)))
+
+    assert server.peak == 2
+    handler.close()
+
+
+def test_get_within(server):
+    """Fetches missing the deadline of their view raise a `TimeoutError`.
+    """
+
+    server.delay = 0.2
+    handler = api.ApiHandler('http://127.0.0.1:%d' % server.server_port)
+    with pytest.raises(TimeoutError):
+        handler.get_within({}, 0.05, endpoint='/slow/')
+
+    assert handler.get_within({}, 1, endpoint='/a/') == dict(path='/a/')
+    handler.close()
+
+
+def test_get_many(server):
+    """Batched requests return the responses in order.
+    """
+
+    handler = api.ApiHandler('http://127.0.0.1:%d' % server.server_port)
+    responses = handler.get_many({}, [
+        dict(view_name='A', endpoint='/a/', params=None),
+        dict(view_name='B', endpoint='/b/', params=dict(x=1))])
+
+    assert responses == [dict(path='/a/'), dict(path='/b/?x=1')]
+    handler.close()
+
+
+def test_url():
+    handler = api.ApiHandler('http://api/v1/')
+    assert handler.url('/items/') == 'http://api/v1/items/'
+    assert handler.url('https://other/x/') == 'https://other/x/'
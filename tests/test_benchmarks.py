@@ -0,0 +1,26 @@
+from benchmarks import render
+
+
+def test_benchmark():
+    """All the scenarios run and report their results.
+    """
+
+    report = render.benchmark(
+        size=3, requests=4, concurrency=2, distribution='constant:1')
+
+    assert len(report['results']) == 8
+    result = report['results']['fetching.view_handler']
+    assert result['requests'] == 4
+    assert result['p50'] <= result['p99']
+    assert result['peak_threads'] > 1
+    assert result['peak_rss'] > 0
+
+
+def test_latency():
+    """Latencies are reproducible with the same seed.
+    """
+
+    first = render.latency('lognormal:20:0.5', seed=1)
+    second = render.latency('lognormal:20:0.5', seed=1)
+    assert [first() for _ in range(5)] == [second() for _ in range(5)]
+    assert render.latency('constant:10')() == 0.01
@@ -0,0 +1,55 @@
+from unittest.mock import MagicMock
+
+from lemon import cache
+
+
+def test_lru_eviction():
+    """The least recently used entries are evicted once the cache is full.
+    """
+
+    lru = cache.LRUCache(size=2)
+    lru.set('a', 1, 10)
+    lru.set('b', 2, 10)
+    assert lru.get('a') == 1
+
+    lru.set('c', 3, 10)
+    assert lru.get('b') is None
+    assert lru.get('a') == 1
+    assert lru.get('c') == 3
+
+
+def test_lru_expiration(monkeypatch):
+    """Entries are not returned once their ttl is over.
+    """
+
+    clock = MagicMock(return_value=100)
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+
+    lru = cache.LRUCache()
+    lru.set('a', 1, 10)
+    assert lru.get('a') == 1
+
+    clock.return_value = 111
+    assert lru.get('a') is None
+    assert not lru.entries
+
+
+def test_cache_stats():
+    """The cache counts its hits and misses.
+    """
+
+    api_cache = cache.Cache(cache.LRUCache())
+    api_cache.set('a', 1, 10)
+    api_cache.get('a')
+    api_cache.get('b')
+    assert api_cache.stats() == dict(hits=1, misses=1)
+
+
+def test_key_normalization():
+    """Keys do not depend on the order of the params or on missing params.
+    """
+
+    assert cache.key('/a/', dict(x=1, y=2)) == cache.key('/a/', dict(y=2, x=1))
+    assert cache.key('/a/', dict(x=None)) == cache.key('/a/')
+    assert cache.key('/a/') != cache.key('/b/')
+    assert cache.key('/a/', vary=dict(user=1)) != cache.key('/a/')
@@ -0,0 +1,55 @@
+from unittest.mock import MagicMock
+from werkzeug.datastructures import Accept
+import gzip
+
+from lemon import cache
+from lemon import compress
+
+
+def test_encode():
+    """Bodies are compressed, unless the encoding is not smaller.
+    """
+
+    data = b'Hello World ' * 100
+    assert gzip.decompress(compress.encode(data, 'gzip')) == data
+    assert compress.encode(b'Hi', 'gzip') is None
+
+
+def test_negotiate():
+    """The encoding preferred by the client is picked.
+    """
+
+    assert compress.negotiate(Accept([('gzip', 1)])) == 'gzip'
+    assert compress.negotiate(Accept([('gzip', 0.5), ('zstd', 1)])) == 'gzip'
+    assert compress.negotiate(Accept([('zstd', 1)])) == 'identity'
+    assert compress.negotiate(Accept()) == 'identity'
+
+
+def test_lookup(monkeypatch):
+    """Bodies are compressed from the second sighting of their etag, once per
+    encoding asked.
+    """
+
+    lemon = MagicMock()
+    lemon.compressed = cache.LRUCache()
+    lemon.app.config = dict(
+        LEMON_COMPRESS_MIN_SIZE=10, LEMON_COMPRESS_LEVEL=6,
+        LEMON_COMPRESS_BROTLI_QUALITY=4)
+    encode = MagicMock(side_effect=compress.encode)
+    monkeypatch.setattr(compress, 'encode', encode)
+
+    body = 'Hello World ' * 100
+    accept_gzip = Accept([('gzip', 1)])
+    assert compress.lookup(lemon, body, 'etag', accept_gzip) is None
+    assert compress.lookup(lemon, 'Hi', 'small', accept_gzip) is None
+    assert lemon.compressed.get('small') is None
+
+    for _ in range(2):
+        data, encoding = compress.lookup(lemon, body, 'etag', accept_gzip)
+        assert encoding == 'gzip'
+        assert gzip.decompress(data) == body.encode('utf-8')
+
+    data, encoding = compress.lookup(lemon, body, 'etag', Accept())
+    assert encoding == 'identity'
+    assert data == body.encode('utf-8')
+    assert encode.call_count == 1
@@ -0,0 +1,68 @@
+from flask import json
+from unittest.mock import MagicMock
+import html
+import pytest
+import werkzeug.exceptions
+
+from lemon import defer
+from lemon import scope
+from lemon import view
+from tests.fixtures.fixture_server import app
+from tests.fixtures.fixture_server import client
+from tests.fixtures.fixture_server import lemon
+
+
+def test_sign(monkeypatch):
+    """Signed descriptions are loaded from their token.
+    """
+
+    monkeypatch.setattr(app, 'secret_key', 'secret')
+    description = dict(path='Button', params=dict(a=1), fetch=None, id='b')
+    token = defer.sign(lemon, description)
+
+    assert defer.load(lemon, dict(token=token)) == description
+    with app.app_context():
+        with pytest.raises(werkzeug.exceptions.BadRequest):
+            defer.load(lemon, dict(token=token + 'x'))
+
+
+def test_signed_only(monkeypatch):
+    """Unsigned descriptions are refused with `LEMON_VIEW_SIGNED`.
+    """
+
+    monkeypatch.setitem(app.config, 'LEMON_VIEW_SIGNED', True)
+    response = client.get('/view/', query_string=dict(
+        data='{"path": "Button"}'))
+    assert response.status_code == 403
+
+
+def test_defer(monkeypatch):
+    """Deferred views are neither fetched nor rendered, and are loaded later
+    with their token.
+    """
+
+    mock = MagicMock(return_value='response')
+    monkeypatch.setattr(lemon.api_handler, 'get', mock)
+    monkeypatch.setattr(app, 'secret_key', 'secret')
+    monkeypatch.setitem(app.config, 'LEMON_VIEW_SIGNED', True)
+
+    button = view.View('Button')
+    markup = button.render(
+        lemon=lemon, scope=scope.Scope(), defer=True, id='button',
+        fetch=dict(endpoint='/me/'))
+
+    assert not mock.called
+    assert markup.find('<button') == -1
+    assert button.to_dict()['deferred']
+
+    description = json.loads(html.unescape(
+        markup.split('data-lemon-lazy="')[1].split('"')[0]))
+    assert description['path'] == 'Button'
+
+    response = client.get('/view/', query_string=dict(
+        data=json.dumps(dict(token=description['token']))))
+    obj = json.loads(response.data)
+
+    assert mock.called
+    assert obj['html'].find('<button') > -1
+    assert obj['tree']['id'] == 'button'
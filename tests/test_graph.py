@@ -0,0 +1,115 @@
+import jinja2
+
+from lemon import graph
+from lemon import scope
+from lemon import view
+from tests.fixtures.fixture_server import app
+from tests.fixtures.fixture_server import lemon
+
+
+def test_dependencies():
+    """The views always included are found, with their params and fetch.
+    """
+
+    env = jinja2.Environment()
+    dependencies = graph.dependencies(env.parse(
+        "{{ view('A', fetch={'endpoint': '/a/', 'params': params}) }}"
+        "{{ view('B', defer=True, fetch={'endpoint': '/b/'}) }}"
+        "{% for item in data %}{{ view('C', fetch=item) }}{% endfor %}"))
+
+    assert [dependency.path for dependency in dependencies] == ['A']
+    assert dependencies[0].resolve(dict(id=1)) == (
+        {}, dict(endpoint='/a/', params=dict(id=1)))
+
+
+def test_dependencies_assigned_params():
+    """`params` assigned in the template is not the params of the view.
+    """
+
+    env = jinja2.Environment()
+    for source in [
+            "{% set params = {'id': 5} %}",
+            "{% set params %}5{% endset %}",
+            "{% with params = {'id': 5} %}{% endwith %}",
+            "{% set x, params = 1, {'id': 5} %}"]:
+        dependencies = graph.dependencies(env.parse(
+            source + "{{ view('X', fetch=Api('/a/', {'id': params.id})) }}"
+            "{{ view('Y', fetch=Api('/b/')) }}"))
+
+        assert [d.resolve(dict(id=1))[1] for d in dependencies] == [
+            None, dict(endpoint='/b/')]
+
+
+def test_evaluate():
+    """Only literals and params can be evaluated.
+    """
+
+    env = jinja2.Environment()
+
+    def expression(source):
+        return env.parse('{{ %s }}' % source).body[0].nodes[0]
+
+    assert graph.evaluate(
+        expression("Api('/x/', {'id': params.id})"), dict(id=2)) == dict(
+            endpoint='/x/', params=dict(id=2))
+    for source in ['data.id', 'params.items()', 'params.id']:
+        try:
+            graph.evaluate(expression(source), None)
+            assert False, source
+        except graph.Dynamic:
+            pass
+
+
+def test_prefetch(monkeypatch):
+    """The fetches of the tree are started before the views are rendered.
+    """
+
+    calls = []
+
+    def get(context, view_name=None, endpoint=None, params=None):
+        calls.append((view_name, endpoint))
+        return 'response'
+
+    monkeypatch.setattr(lemon.api_handler, 'get', get)
+    monkeypatch.setattr(lemon, 'graph', graph.analyze(app.jinja_env))
+
+    fetches = graph.prefetch(
+        lemon.graph, 'Dashboard', dict(id=3), view.template_path)
+    assert sorted(fetches) == [
+        ('Button', dict(endpoint='/me/')),
+        ('Slow', dict(endpoint='/charts/', params=dict(id=3)))]
+
+    with app.test_request_context('/'):
+        html = view.render_main_view(
+            lemon, 'Dashboard', params=dict(id=3), scope=scope.Scope())
+
+    assert html.find('<button') > -1
+    assert sorted(calls) == [('Button', '/me/'), ('Slow', '/charts/')]
+
+
+def test_prefetch_batch(monkeypatch):
+    """Prefetched endpoints are not fetched again by the batches.
+    """
+
+    calls = []
+
+    class BatchApiHandler():
+
+        def get(self, context, view_name=None, endpoint=None, params=None):
+            calls.append(endpoint)
+            return 'response'
+
+        def get_many(self, context, requests):
+            calls.extend(r.get('endpoint') for r in requests)
+            return ['response' for r in requests]
+
+    monkeypatch.setattr(lemon, 'api_handler', BatchApiHandler())
+    monkeypatch.setattr(lemon, 'graph', graph.analyze(app.jinja_env))
+    monkeypatch.setitem(app.config, 'LEMON_FETCH_BATCH', True)
+
+    with app.test_request_context('/'):
+        html = view.render_main_view(
+            lemon, 'Dashboard', params=dict(id=3), scope=scope.Scope())
+
+    assert html.find('<button') > -1
+    assert sorted(calls) == ['/charts/', '/me/']
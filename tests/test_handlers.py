@@ -1,9 +1,14 @@
 from flask import json
 from unittest.mock import MagicMock
 from unittest.mock import patch
+import time
 
-from lemon import view
+from lemon import aio
+from lemon import cache
 from lemon import handlers
+from lemon import pool
+from lemon import view
+from tests.fixtures import fixture_server
 
 
 def test_view_handler(monkeypatch):
@@ -16,3 +21,192 @@ def test_view_handler(monkeypatch):
         obj = json.loads(response)
         assert obj.get('html') == 'HTML'
         assert obj.get('tree').get('path') == 'Test'
+
+
+def test_view_handler_async(monkeypatch):
+    """Synchronous api handlers are run by the pool on the async path.
+    """
+
+    mock = MagicMock(return_value='response')
+    monkeypatch.setattr(fixture_server.lemon.api_handler, 'get', mock)
+
+    response = aio.run(handlers.view_handler_async(
+        fixture_server.lemon,
+        dict(path='Button', fetch=dict(endpoint='/url/'), id='button')))
+    obj = json.loads(response)
+
+    assert obj.get('html').find('<button') > -1
+    assert obj.get('tree').get('id') == 'button'
+    assert mock.called
+
+
+def test_view_handler_batch(monkeypatch):
+    """Several views are rendered in a single request, each one with its own
+    result.
+    """
+
+    mock = MagicMock(return_value='response')
+    monkeypatch.setattr(fixture_server.lemon.api_handler, 'get', mock)
+
+    data = json.dumps([
+        dict(path='Button', id='first', fetch=dict(endpoint='/me/')),
+        dict(path='Button', id='second', fetch=dict(endpoint='/me/')),
+        dict(path='Missing')])
+    response = fixture_server.client.get('/view/', query_string=dict(
+        data=data))
+    obj = json.loads(response.data)
+
+    assert sorted(obj) == ['2', 'first', 'second']
+    assert obj['first']['html'].find('<button') > -1
+    assert obj['second']['tree']['id'] == 'second'
+    assert obj['2']['error']
+    assert mock.call_count == 1
+
+
+def test_view_handler_batch_async(monkeypatch):
+    """Several views are rendered in a single request (asyncio).
+    """
+
+    response = aio.run(handlers.view_handler_async(
+        fixture_server.lemon, [dict(path='Button', id='first'),
+                               dict(path='Missing', id='missing')]))
+    obj = json.loads(response)
+
+    assert obj['first']['html'].find('<button') > -1
+    assert obj['missing']['error']
+
+
+def test_view_handler_unchanged(monkeypatch):
+    """The views of the client tree whose inputs did not change are not
+    rendered again.
+    """
+
+    mock = MagicMock(return_value='response')
+    monkeypatch.setattr(fixture_server.lemon.api_handler, 'get', mock)
+
+    response = fixture_server.client.get('/view/', query_string=dict(
+        data=json.dumps(dict(path='Toolbar'))))
+    tree = json.loads(response.data)['tree']
+    button = tree['children'][0]
+
+    tree['fingerprint'] = 'changed'
+    response = fixture_server.client.get('/view/', query_string=dict(
+        data=json.dumps(dict(tree=tree))))
+    obj = json.loads(response.data)
+
+    assert obj['tree']['element_id'] != tree['element_id']
+    assert obj['tree']['children'][0]['unchanged']
+    assert obj['tree']['children'][0]['element_id'] == button['element_id']
+    assert obj['html'].find('<button') == -1
+    assert obj['html'].find('data-lemon-unchanged') > -1
+
+
+def test_view_handler_unchanged_not_cached(monkeypatch):
+    """The placeholders of the unchanged views are not stored in the
+    fragment cache.
+    """
+
+    lemon = fixture_server.lemon
+    mock = MagicMock(return_value='response')
+    monkeypatch.setattr(lemon.api_handler, 'get', mock)
+    monkeypatch.setattr(
+        lemon, 'fragment_cache', cache.FragmentCache(cache.LRUCache()))
+    lemon.fragment_cache.declare('Toolbar', 60)
+
+    response = fixture_server.client.get('/view/', query_string=dict(
+        data=json.dumps(dict(path='Toolbar'))))
+    tree = json.loads(response.data)['tree']
+    lemon.invalidate_view('Toolbar')
+
+    tree['fingerprint'] = 'changed'
+    fixture_server.client.get('/view/', query_string=dict(
+        data=json.dumps(dict(tree=tree))))
+
+    response = fixture_server.client.get('/view/', query_string=dict(
+        data=json.dumps(dict(path='Toolbar'))))
+    obj = json.loads(response.data)
+    assert obj['html'].find('<button') > -1
+    assert obj['html'].find('data-lemon-unchanged') == -1
+
+
+def test_view_handler_target(monkeypatch):
+    """The target of the client tree is resolved by child indices.
+    """
+
+    mock = MagicMock(return_value='response')
+    monkeypatch.setattr(fixture_server.lemon.api_handler, 'get', mock)
+
+    response = fixture_server.client.get('/view/', query_string=dict(
+        data=json.dumps(dict(path='Toolbar'))))
+    tree = json.loads(response.data)['tree']
+    tree['children'][0]['fingerprint'] = 'changed'
+
+    response = fixture_server.client.get('/view/', query_string=dict(
+        data=json.dumps(dict(tree=tree, target=[0]))))
+    obj = json.loads(response.data)
+
+    assert obj['tree']['path'] == 'Button'
+    assert obj['html'].find('<button') > -1
+    assert not obj['tree'].get('unchanged')
+
+    for target in [[3], [0, 0], ['a'], 'missing']:
+        response = fixture_server.client.get('/view/', query_string=dict(
+            data=json.dumps(dict(tree=tree, target=target))))
+        assert response.status_code == 404
+
+
+def test_render_partials_batch(monkeypatch):
+    """The partial views of a request are fetched in the same batches.
+    """
+
+    class BatchApiHandler():
+
+        def __init__(self):
+            self.batches = []
+
+        def get_many(self, context, requests):
+            self.batches.append([r.get('endpoint') for r in requests])
+            return [r.get('endpoint') for r in requests]
+
+    lemon = fixture_server.lemon
+    handler = BatchApiHandler()
+    monkeypatch.setattr(lemon, 'api_handler', handler)
+    monkeypatch.setitem(fixture_server.app.config, 'LEMON_FETCH_BATCH', True)
+
+    descriptions = [
+        dict(path='Toolbar', fetch=dict(endpoint='/%d/' % index))
+        for index in range(2)]
+    with fixture_server.app.test_request_context('/'):
+        results = json.loads(handlers.render_partials(lemon, descriptions))
+
+    assert handler.batches == [['/0/', '/1/'], ['/me/']]
+    assert len(results) == 2
+    for result in results.values():
+        assert result['html'].find('<button') > -1
+
+
+def test_render_partials_small_pool(monkeypatch):
+    """Partial views do not hold the workers their children need: none of
+    them misses its deadline with a fast api.
+    """
+
+    lemon = fixture_server.lemon
+    monkeypatch.setattr(
+        lemon.api_handler, 'get', MagicMock(return_value='response'))
+    monkeypatch.setattr(lemon, 'pool', pool.Pool(2, 8))
+    monkeypatch.setitem(
+        fixture_server.app.config, 'LEMON_RENDER_DEADLINE', 0.5)
+
+    descriptions = [
+        dict(path='Toolbar', fetch=dict(endpoint='/%d/' % index))
+        for index in range(4)]
+    start = time.monotonic()
+    response = fixture_server.client.get('/view/', query_string=dict(
+        data=json.dumps(descriptions)))
+    results = json.loads(response.data)
+
+    assert time.monotonic() - start < 0.4
+    assert not response.headers.get('X-Lemon-Degraded')
+    for result in results.values():
+        assert not result['tree']['children'][0].get('degraded')
+        assert result['html'].find('<button') > -1
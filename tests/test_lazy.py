@@ -0,0 +1,81 @@
+from unittest.mock import MagicMock
+import threading
+
+import flask
+
+from lemon import Lemon
+from lemon import lazy
+from tests.fixtures.fixture_server import app
+
+
+def test_lazy_context():
+    """Context functions are only called when read, once per request.
+    """
+
+    user = MagicMock(return_value='user')
+    unused = MagicMock(return_value='unused')
+    providers = dict(user=lazy.Provider(user), unused=lazy.Provider(unused))
+
+    context = lazy.LazyContext(providers)
+    assert context['user'] == 'user'
+    assert context.get('user') == 'user'
+    assert user.call_count == 1
+    assert not unused.called
+    assert list(context.timings) == ['user']
+    assert sorted(context) == ['unused', 'user']
+
+    lazy.LazyContext(providers)['user']
+    assert user.call_count == 2
+
+
+def test_provider_ttl(monkeypatch):
+    """Providers with a ttl are shared between requests.
+    """
+
+    clock = MagicMock(return_value=100)
+    monkeypatch.setattr(lazy.time, 'monotonic', clock)
+
+    fn = MagicMock(return_value='value')
+    provider = lazy.Provider(fn, ttl=10)
+    assert provider() == provider() == 'value'
+    assert fn.call_count == 1
+
+    clock.return_value = 111
+    provider()
+    assert fn.call_count == 2
+
+
+def test_add_context():
+    """Context functions are registered with or without options.
+    """
+
+    lemon = Lemon()
+
+    @lemon.add_context
+    def first():
+        return 1
+
+    @lemon.add_context(ttl=10)
+    def second():
+        return 2
+
+    assert first() == 1
+    assert dict(lemon.context) == dict(first=1, second=2)
+    assert lemon._context['second'].ttl == 10
+
+
+def test_lazy_context_thread():
+    """Context functions called from another thread can use the request.
+    """
+
+    providers = dict(path=lazy.Provider(lambda: flask.request.path))
+    values = []
+
+    with app.test_request_context('/path/'):
+        context = lazy.LazyContext(providers)
+        thread = threading.Thread(target=lambda: values.append(
+            context['path']))
+        thread.start()
+        thread.join()
+
+    assert values == ['/path/']
@@ -0,0 +1,42 @@
+from unittest.mock import MagicMock
+import threading
+
+from lemon import pool
+
+
+def test_submit():
+    """Tasks submitted to the pool are run by a worker.
+    """
+
+    my_pool = pool.Pool(2)
+    future = my_pool.submit(threading.current_thread)
+    assert future.result() is not threading.current_thread()
+    my_pool.shutdown()
+
+
+def test_submit_saturated():
+    """A saturated pool refuses new tasks until a slot is released.
+    """
+
+    event = threading.Event()
+    my_pool = pool.Pool(1, queue_size=1)
+
+    first = my_pool.submit(event.wait)
+    second = my_pool.submit(event.wait)
+    assert first and second
+    assert my_pool.submit(MagicMock()) is None
+
+    event.set()
+    first.result()
+    second.result()
+    assert my_pool.submit(MagicMock())
+    my_pool.shutdown()
+
+
+def test_submit_after_shutdown():
+    """Once shutdown, the pool does not accept any task.
+    """
+
+    my_pool = pool.Pool(1)
+    my_pool.shutdown()
+    assert my_pool.submit(MagicMock()) is None
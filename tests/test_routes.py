@@ -1,6 +1,11 @@
+from flask import json
 from unittest.mock import MagicMock
+import gzip
 import pytest
+import time
 
+from lemon import cache
+from lemon import compress
 from lemon import route
 from lemon import view
 from tests.fixtures.fixture_server import app
@@ -100,3 +105,178 @@ def test_route_preparation():
         assert s['params']['param2']['param3'] == new and 'v2' or '<value3>'
         assert s['fetch']['params']['params1'] == new and 'v1' or '<value1>'
         assert s['fetch']['params']['params4'] == new and 'v4' or '<value4>'
+
+
+def test_route_stream(monkeypatch):
+    """Routes with the stream option return a streamed response.
+    """
+
+    with app.app_context():
+        route.add(lemon, '/streamed/', 'Button', stream=True)
+        response = client.get('/streamed/')
+        assert response.is_streamed
+        assert response.data.find(b'<button') > -1
+
+
+def test_route_compile_options():
+    """Test the substitution plan of the routes.
+
+    Values without placeholders are shared between the requests, and the
+    original options of the view remain unchanged.
+    """
+
+    static = {'page': 1, 'empty': None}
+    options = dict(
+        params={
+            'param1': '<value1>',
+            'param2': {'param3': '/<value3>/{query}/'},
+            'param4': '{missing}',
+            'static': static,
+        },
+        fetch={
+            'endpoint': '/test/<value1>/',
+            'params': {'params1': '<value1>', 'number': '<number>'}
+        })
+
+    plan = route.compile_options(options)
+    view_options = plan.fill(
+        dict(value1='v1', value3='v3', number=3), dict(query='q'))
+
+    assert view_options['params']['param1'] == 'v1'
+    assert view_options['params']['param2']['param3'] == '/v3/q/'
+    assert view_options['params']['param4'] is None
+    assert view_options['params']['static'] == {'page': 1}
+    assert view_options['fetch']['endpoint'] == '/test/v1/'
+    assert view_options['fetch']['params']['number'] == 3
+
+    other = plan.fill(dict(value1='v2'), {})
+    assert other['params']['param1'] == 'v2'
+    assert other['params']['static'] is view_options['params']['static']
+    assert options['params']['param1'] == '<value1>'
+    assert options['params']['static'] is static
+
+
+def test_route_etag(monkeypatch):
+    """Routes with an etag answer with a 304 when the page has not changed.
+    """
+
+    with app.app_context():
+        monkeypatch.setattr(
+            view, 'render_main_view', MagicMock(return_value='Page'))
+        route.add(
+            lemon, '/etag/', 'ViewName', etag=True,
+            cache_control='max-age=30')
+
+        response = client.get('/etag/')
+        etag = response.headers.get('ETag')
+        assert etag
+        assert response.headers.get('Cache-Control') == 'max-age=30'
+        assert response.data == b'Page'
+
+        response = client.get('/etag/', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert not response.data
+
+
+def test_view_endpoint_etag(monkeypatch):
+    """The /view/ endpoint adds etags when `LEMON_VIEW_ETAG` is set.
+    """
+
+    monkeypatch.setitem(app.config, 'LEMON_VIEW_ETAG', True)
+    response = client.get('/view/?data={"path": "Button"}')
+    assert response.headers.get('ETag')
+    assert response.mimetype == 'application/json'
+
+    response = client.get(
+        '/view/?data={"path": "Button"}',
+        headers={'If-None-Match': response.headers.get('ETag')})
+    assert response.status_code == 304
+
+
+def test_route_compress(monkeypatch):
+    """Pages whose etag comes back are compressed once, in the encoding
+    accepted by the client.
+    """
+
+    page = 'Page ' * 500
+    render = MagicMock(return_value=page)
+    encode = MagicMock(side_effect=compress.encode)
+    monkeypatch.setattr(view, 'render_main_view', render)
+    monkeypatch.setattr(compress, 'encode', encode)
+    monkeypatch.setattr(lemon, 'compressed', cache.LRUCache())
+    with app.app_context():
+        route.add(lemon, '/compress/', 'ViewName', etag=True)
+
+    response = client.get('/compress/', headers={'Accept-Encoding': 'gzip'})
+    assert not response.headers.get('Content-Encoding')
+    assert response.data == page.encode('utf-8')
+
+    for _ in range(2):
+        response = client.get(
+            '/compress/', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers.get('Content-Encoding') == 'gzip'
+        assert response.headers.get('Vary') == 'Accept-Encoding'
+        assert gzip.decompress(response.data) == page.encode('utf-8')
+
+    response = client.get('/compress/')
+    assert not response.headers.get('Content-Encoding')
+    assert response.data == page.encode('utf-8')
+    assert render.call_count == 4
+    assert encode.call_count == 1
+
+
+def test_route_server_timing(monkeypatch):
+    """Routes send the timings of the views with `LEMON_SERVER_TIMING`.
+    """
+
+    monkeypatch.setitem(app.config, 'LEMON_SERVER_TIMING', True)
+    monkeypatch.setitem(app.config, 'LEMON_SERVER_TIMING_TOP', 2)
+    with app.app_context():
+        route.add(lemon, '/timing/', 'Button')
+
+    header = client.get('/timing/').headers.get('Server-Timing')
+    assert header.count('dur=') == 2
+
+    monkeypatch.setitem(app.config, 'LEMON_SERVER_TIMING', False)
+    assert not client.get('/timing/').headers.get('Server-Timing')
+
+
+def test_view_endpoint_timing(monkeypatch):
+    """The tree of the /view/ endpoint includes the timings of the views.
+    """
+
+    mock = MagicMock(return_value='response')
+    monkeypatch.setattr(lemon.api_handler, 'get', mock)
+    monkeypatch.setitem(app.config, 'LEMON_SERVER_TIMING', True)
+
+    response = client.get('/view/', query_string=dict(
+        data='{"path": "Toolbar"}'))
+    tree = json.loads(response.data)['tree']
+
+    assert 'fetch;desc="Button"' in response.headers.get('Server-Timing')
+    assert sorted(tree['timings']) == ['children', 'stitch', 'template']
+    assert 'fetch' in tree['children'][0]['timings']
+
+
+def test_view_endpoint_degraded(monkeypatch):
+    """The /view/ endpoint lists the views which missed their deadline.
+    """
+
+    def get(*args, **kwargs):
+        time.sleep(0.5)
+
+    def get_within(context, timeout, **kwargs):
+        time.sleep(timeout)
+        raise TimeoutError()
+
+    monkeypatch.setattr(lemon.api_handler, 'get', get)
+    monkeypatch.setattr(
+        lemon.api_handler, 'get_within', get_within, raising=False)
+    monkeypatch.setitem(app.config, 'LEMON_RENDER_DEADLINE', 0.05)
+
+    response = client.get('/view/', query_string=dict(
+        data='{"path": "Toolbar"}'))
+    tree = json.loads(response.data)['tree']
+
+    assert response.headers.get('X-Lemon-Degraded') == 'Button'
+    assert tree['children'][0]['degraded']
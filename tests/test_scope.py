@@ -0,0 +1,83 @@
+from unittest.mock import MagicMock
+import asyncio
+import threading
+
+import pytest
+
+from lemon import aio
+from lemon import scope
+
+
+def test_single_flight():
+    """Concurrent calls with the same key share a single call.
+    """
+
+    event = threading.Event()
+    fn = MagicMock(side_effect=lambda: event.wait(1) and 'result')
+    request_scope = scope.Scope()
+    results = []
+
+    threads = [
+        threading.Thread(target=lambda: results.append(
+            request_scope.single_flight('key', fn)))
+        for i in range(3)]
+    for thread in threads:
+        thread.start()
+    event.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['result'] * 3
+    assert fn.call_count == 1
+    assert request_scope.single_flight('other', lambda: 'other') == 'other'
+
+
+def test_single_flight_error():
+    """Errors are raised for all the callers.
+    """
+
+    request_scope = scope.Scope()
+    fn = MagicMock(side_effect=ValueError)
+
+    for i in range(2):
+        with pytest.raises(ValueError):
+            request_scope.single_flight('key', fn)
+    assert fn.call_count == 1
+
+
+def test_single_flight_async():
+    """Concurrent coroutines with the same key share a single call.
+    """
+
+    calls = []
+    request_scope = scope.Scope()
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return 'result'
+
+    async def run():
+        return await asyncio.gather(*[
+            request_scope.single_flight_async('key', fn) for i in range(3)])
+
+    assert aio.run(run()) == ['result'] * 3
+    assert len(calls) == 1
+
+
+def test_element_ids():
+    """Element ids are unique, and do not change the etag of a response.
+    """
+
+    first = scope.Scope()
+    second = scope.Scope()
+    ids = [first.new_element_id() for i in range(3)]
+    assert len(set(ids)) == 3
+    assert ids[0].startswith(first.prefix)
+
+    other_ids = [second.new_element_id() for i in range(3)]
+    body = '<div id="%s"><div id="%s"></div></div>'
+    assert first.etag(body % tuple(ids[:2])) == second.etag(
+        body % tuple(other_ids[1:]))
+    assert first.etag(body % tuple(ids[:2])) != first.etag(
+        body % tuple(ids[:2]) + ' ')
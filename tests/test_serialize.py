@@ -0,0 +1,47 @@
+from flask import json
+import jinja2
+
+from lemon import serialize
+from lemon import view
+from tests.fixtures import fixture_server
+
+
+def test_partial(monkeypatch):
+    """The partial view is serialized in chunks, with the same tree as
+    `View.to_dict`.
+    """
+
+    monkeypatch.setattr(serialize, 'CHUNK_SIZE', 4)
+    parent = view.View('Parent')
+    parent.html = jinja2.Markup('<div id="parent">"Hello"\n</div>')
+    child = view.View('Child')
+    child.params = {1: 'one'}
+    parent.add_child(child)
+
+    chunks = list(serialize.partial(parent))
+    obj = json.loads(''.join(chunks))
+
+    assert len(chunks) > 10
+    assert obj['html'] == parent.html
+    assert obj['tree'] == json.loads(serialize.dumps(parent.to_dict()))
+
+
+def test_dumps_without_orjson(monkeypatch):
+    """The json module is used when orjson is not installed.
+    """
+
+    monkeypatch.setattr(serialize, 'orjson', None)
+    assert serialize.dumps(dict(a=[1, 'b'])) == '{"a":[1,"b"]}'
+
+
+def test_view_endpoint_stream():
+    """The /view/ endpoint streams the json of the view.
+    """
+
+    response = fixture_server.client.get(
+        '/view/', query_string=dict(data='{"path": "Button"}'))
+    obj = json.loads(response.data)
+
+    assert response.mimetype == 'application/json'
+    assert obj['html'].find('<button') > -1
+    assert obj['tree']['path'] == 'Button'
@@ -0,0 +1,75 @@
+import os
+
+import jinja2
+
+from lemon import templates
+
+
+VIEW_PATH = 'tests/fixtures/views/'
+
+
+def count_views(env):
+    return len(env.list_templates(
+        filter_func=lambda name: name.endswith('.nunjucks')))
+
+
+def test_precompile():
+    """All the views of the environment are compiled.
+    """
+
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader([VIEW_PATH]))
+    views = count_views(env)
+    assert views > 0
+    assert templates.precompile(env) == views
+    assert len(env.cache) == views
+
+
+def test_bytecode_cache(tmpdir):
+    """Compiled views are written in the bytecode cache, one file per view and
+    per environment.
+    """
+
+    directory = str(tmpdir.join('bytecode'))
+    for name in ['sync', 'async']:
+        env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader([VIEW_PATH]),
+            bytecode_cache=templates.bytecode_cache(directory, name))
+        templates.precompile(env)
+
+    views = count_views(env)
+    files = os.listdir(directory)
+    assert len(files) == 2 * views
+    assert len([f for f in files if f.startswith('lemon_sync_')]) == views
+
+
+def test_no_bytecode_cache():
+    """No bytecode cache is created without a directory.
+    """
+
+    assert templates.bytecode_cache(None, 'sync') is None
+
+
+def test_is_static():
+    """Views which only depend on their template are static.
+    """
+
+    env = jinja2.Environment(loader=jinja2.DictLoader({
+        'Text/Text.nunjucks': "{{ describe('p') }}{{ ['Hello']|first }}",
+        'Params/Params.nunjucks': '{{ params.title }}',
+        'Data/Data.nunjucks': '{% if data %}{{ data }}{% endif %}',
+        'Child/Child.nunjucks': "{{ view('Text') }}",
+        'Random/Random.nunjucks': '{{ [1, 2]|random }}',
+        'Icon/Icon.nunjucks': "<i>{% include 'Part/Part.nunjucks' %}</i>",
+        'Page/Page.nunjucks': "{% extends 'Text/Text.nunjucks' %}",
+        'Macro/Macro.nunjucks': "{% from 'Text/Text.nunjucks' import x %}",
+        'Part/Part.nunjucks': '{{ params.title }}'}))
+
+    assert templates.is_static(env, 'Text/Text.nunjucks')
+    assert not templates.is_static(env, 'Params/Params.nunjucks')
+    assert not templates.is_static(env, 'Data/Data.nunjucks')
+    assert not templates.is_static(env, 'Child/Child.nunjucks')
+    assert not templates.is_static(env, 'Random/Random.nunjucks')
+    assert not templates.is_static(env, 'Icon/Icon.nunjucks')
+    assert not templates.is_static(env, 'Page/Page.nunjucks')
+    assert not templates.is_static(env, 'Macro/Macro.nunjucks')
+    assert not templates.is_static(env, 'Missing/Missing.nunjucks')
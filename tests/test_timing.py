@@ -0,0 +1,41 @@
+from lemon import timing
+from lemon import view
+
+
+def test_header():
+    """The header keeps the slowest entries.
+    """
+
+    timings = timing.Timings()
+    timings.add('fetch', 0.120, 'Artists')
+    timings.add('template', 0.003)
+    timings.add('access', 0.001)
+
+    assert timings.header(2) == (
+        'fetch;desc="Artists";dur=120.0, template;dur=3.0')
+
+
+def test_measure():
+    """Views without timings are not measured.
+    """
+
+    button = view.View('Button')
+    assert timing.measure(button, 'fetch') is timing.NULL_TIMER
+
+    button.timings = {}
+    with timing.measure(button, 'fetch'):
+        pass
+    with timing.measure(button, 'fetch'):
+        pass
+    assert list(button.timings) == ['fetch']
+    assert 'timings' in button.to_dict()
+
+
+def test_add_context():
+    """The context keys evaluated are added to the timings.
+    """
+
+    context = type('Context', (), dict(timings=dict(user=0.002)))()
+    timings = timing.Timings()
+    timings.add_context(context)
+    assert timings.entries == [('context', 0.002, 'user')]
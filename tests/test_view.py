@@ -3,10 +3,16 @@ from tests.fixtures.fixture_api_handler import api
 from tests.fixtures.fixture_server import app
 from tests.fixtures.fixture_server import lemon
 from unittest.mock import MagicMock
+import asyncio
 import os
 import os.path
+import threading
+import time
 
 
+from lemon import aio
+from lemon import cache
+from lemon import scope
 from lemon import view
 
 
@@ -224,3 +230,495 @@ def test_jsonify():
 
     assert view.jsonify(True) == 'true'
     assert view.jsonify({'foo': 'bar'}) == '{"foo": "bar"}'
+
+
+def test_fetching_view_uses_pool(monkeypatch):
+    """Views that fetch data are rendered by the lemon pool.
+    """
+
+    monkeypatch.setattr(
+        app.jinja_env, 'get_template',
+        MagicMock(return_value=Template('Fetched')))
+    monkeypatch.setattr(api, 'get', MagicMock(return_value='response'))
+
+    test_view = view.View('Test')
+    placeholder = test_view.render(
+        lemon=lemon, fetch=dict(endpoint='/url/'))
+
+    assert placeholder == view.placeholder(test_view.element_id)
+    test_view.finish()
+    assert test_view.html.find('Fetched') > 0
+    assert test_view.data == 'response'
+
+
+def test_finish_renders_pending_view(monkeypatch):
+    """A view that has not been picked up by a worker is rendered by the thread
+    that waits for it.
+    """
+
+    monkeypatch.setattr(
+        app.jinja_env, 'get_template',
+        MagicMock(return_value=Template('Fetched')))
+    monkeypatch.setattr(api, 'get', MagicMock(return_value='response'))
+
+    future = MagicMock()
+    future.cancel.return_value = True
+    monkeypatch.setattr(lemon.pool, 'submit', MagicMock(return_value=future))
+
+    test_view = view.View('Test')
+    test_view.render(lemon=lemon, fetch=dict(endpoint='/url/'))
+    test_view.finish()
+
+    assert not future.result.called
+    assert test_view.html.find('Fetched') > 0
+
+
+def test_render_main_view_async():
+    """The main view can be rendered on an event loop.
+    """
+
+    html = aio.run(view.render_main_view_async(lemon, primary_view='Button'))
+    assert html.find('<button') > -1
+    assert html.find('Hello') > -1
+
+
+def test_fetching_data_async(monkeypatch):
+    """Children fetching data with an async handler are awaited concurrently.
+    """
+
+    calls = []
+
+    class AsyncApiHandler():
+
+        async def get(self, context, view_name=None, endpoint=None,
+                      params=None):
+            calls.append(endpoint)
+            await asyncio.sleep(0)
+            return endpoint
+
+    templates = {
+        'Parent/Parent.nunjucks': (
+            "{{ view('Child', fetch={'endpoint': '/a/'}) }}"
+            "{{ view('Child', fetch={'endpoint': '/b/'}) }}"),
+        'Child/Child.nunjucks': '[{{ data }}]'}
+    monkeypatch.setattr(
+        lemon.async_env, 'get_template',
+        lambda name: lemon.async_env.from_string(templates[name]))
+    monkeypatch.setattr(lemon, 'api_handler', AsyncApiHandler())
+
+    parent = view.View('Parent')
+    aio.run(parent.render_async(lemon=lemon))
+
+    assert sorted(calls) == ['/a/', '/b/']
+    assert parent.html.find('[/a/]') < parent.html.find('[/b/]')
+    assert len(parent.children) == 2
+
+
+def test_stitch():
+    """Placeholders are replaced by the html of their view, other content that
+    looks like an element id is left untouched.
+    """
+
+    first = view.View('First')
+    first.html = '<first>'
+    second = view.View('Second')
+    second.html = '<second>'
+
+    html = '%s #%s %s' % (
+        view.placeholder(second.element_id), first.element_id,
+        view.placeholder(first.element_id))
+
+    assert view.stitch(html, [first, second]) == (
+        '<second> #%s <first>' % first.element_id)
+    assert view.stitch('No placeholder', [first]) == 'No placeholder'
+
+
+def test_stream_main_view(monkeypatch):
+    """The shell is sent first, the views fetching data are flushed later on in
+    their slot.
+    """
+
+    event = threading.Event()
+
+    def get(context, view_name=None, endpoint=None, params=None):
+        event.wait(1)
+        return endpoint
+
+    templates = {
+        'AppView/AppView.nunjucks': 'Shell {{ primary_view|safe }}',
+        'Primary/Primary.nunjucks': (
+            "Primary {{ view('Child', fetch={'endpoint': '/a/'}) }}"),
+        'Child/Child.nunjucks': '[{{ data }}]'}
+    monkeypatch.setattr(
+        app.jinja_env, 'get_template',
+        lambda name: app.jinja_env.from_string(templates[name]))
+    monkeypatch.setattr(api, 'get', get)
+
+    with app.test_request_context():
+        chunks = view.stream_main_view(lemon, 'Primary')
+        shell = next(chunks)
+        assert shell.startswith('Shell')
+        assert shell.find('Primary') > 0
+        assert shell.find('<template id="lemon-slot-') > 0
+        assert shell.find('[/a/]') < 0
+
+        event.set()
+        rest = ''.join(chunks)
+        assert rest.find('lemonFill') > 0
+        assert rest.find('[/a/]') > 0
+
+
+def test_stream_fetching_primary_view(monkeypatch):
+    """A primary view fetching data is streamed in its slot, unless it is
+    rendered by the time the shell is.
+    """
+
+    event = threading.Event()
+
+    def get(context, view_name=None, endpoint=None, params=None):
+        event.wait(1)
+        return endpoint
+
+    templates = {
+        'AppView/AppView.nunjucks': 'Shell {{ primary_view|safe }}',
+        'Primary/Primary.nunjucks': '[{{ data }}]'}
+
+    def get_template(name):
+        if name.startswith('AppView'):
+            # The fetch of the primary view completes first.
+            time.sleep(0.1)
+        return app.jinja_env.from_string(templates[name])
+
+    monkeypatch.setattr(app.jinja_env, 'get_template', get_template)
+    monkeypatch.setattr(api, 'get', get)
+
+    with app.test_request_context():
+        event.set()
+        chunks = list(view.stream_main_view(
+            lemon, 'Primary', fetch=dict(endpoint='/fast/')))
+        assert len(chunks) == 1
+        assert chunks[0].find('[/fast/]') > 0
+
+        event.clear()
+        chunks = view.stream_main_view(
+            lemon, 'Primary', fetch=dict(endpoint='/slow/'))
+        shell = next(chunks)
+        assert shell.find('<template id="lemon-slot-') > 0
+        assert shell.find('[/slow/]') < 0
+
+        event.set()
+        assert ''.join(chunks).find('[/slow/]') > 0
+
+
+def test_fetching_cached_data(monkeypatch):
+    """Fetches with a ttl are cached by lemon.
+    """
+
+    mock = MagicMock(return_value='response')
+    monkeypatch.setattr(api, 'get', mock)
+    monkeypatch.setattr(
+        lemon, 'api_cache', cache.Cache(cache.LRUCache()))
+
+    for i in range(2):
+        test_view = view.View('Test')
+        test_view.setup(dict(fetch=dict(endpoint='/cached/', ttl=10)))
+        test_view.fetch(lemon, {})
+        assert test_view.data == 'response'
+
+    assert mock.call_count == 1
+    assert lemon.api_cache.stats() == dict(hits=1, misses=1)
+
+
+def test_fetching_deduplication(monkeypatch):
+    """Views of the same request fetching the same endpoint share one call.
+    """
+
+    mock = MagicMock(return_value='response')
+    monkeypatch.setattr(api, 'get', mock)
+
+    templates = {
+        'AppView/AppView.nunjucks': '{{ primary_view|safe }}',
+        'Primary/Primary.nunjucks': (
+            "{% for i in range(3) %}"
+            "{{ view('Child', fetch={'endpoint': '/me/', 'params': {}}) }}"
+            "{% endfor %}"),
+        'Child/Child.nunjucks': '[{{ data }}]'}
+    monkeypatch.setattr(
+        app.jinja_env, 'get_template',
+        lambda name: app.jinja_env.from_string(templates[name]))
+
+    with app.app_context():
+        html = view.render_main_view(lemon, 'Primary')
+
+    assert html.count('[response]') == 3
+    assert mock.call_count == 1
+
+
+def test_fetching_batch(monkeypatch):
+    """Batched fetches of a tree level are sent in a single call.
+    """
+
+    class BatchApiHandler():
+
+        def __init__(self):
+            self.batches = []
+
+        def get(self, context, view_name=None, endpoint=None, params=None):
+            raise AssertionError('Fetches should be batched.')
+
+        def get_many(self, context, requests):
+            self.batches.append([r.get('endpoint') for r in requests])
+            return [r.get('endpoint') for r in requests]
+
+    templates = {
+        'AppView/AppView.nunjucks': '{{ primary_view|safe }}',
+        'Primary/Primary.nunjucks': (
+            "{{ view('Child', fetch={'endpoint': '/a/'}) }}"
+            "{{ view('Child', fetch={'endpoint': '/b/'}) }}"
+            "{{ view('Child', fetch={'endpoint': '/a/'}) }}"),
+        'Child/Child.nunjucks': (
+            "[{{ data }}"
+            "{{ view('Leaf', fetch={'endpoint': data + 'leaf/'}) }}]"),
+        'Leaf/Leaf.nunjucks': '({{ data }})'}
+    monkeypatch.setattr(
+        app.jinja_env, 'get_template',
+        lambda name: app.jinja_env.from_string(templates[name]))
+
+    handler = BatchApiHandler()
+    monkeypatch.setattr(lemon, 'api_handler', handler)
+    monkeypatch.setitem(app.config, 'LEMON_FETCH_BATCH', True)
+
+    with app.app_context():
+        html = view.render_main_view(
+            lemon, 'Primary', fetch=dict(endpoint='/primary/'))
+
+    assert handler.batches == [
+        ['/primary/'], ['/a/', '/b/'], ['/a/leaf/', '/b/leaf/']]
+    assert html.count('[/a/') == 2
+    assert html.find('(/b/leaf/)') > html.find('[/b/')
+
+
+def test_fragment_cache(monkeypatch):
+    """Views declaring a cache are only rendered once for the same path, params
+    and data. The element ids are unique for each render.
+    """
+
+    renders = []
+    templates = {
+        'Nav/Nav.nunjucks': (
+            "{{ describe('nav', cache=60) }}{{ params.title }}"
+            "{{ view('Link') }}"),
+        'Link/Link.nunjucks': 'Link'}
+
+    def get_template(name):
+        renders.append(name)
+        return app.jinja_env.from_string(templates[name])
+
+    monkeypatch.setattr(app.jinja_env, 'get_template', get_template)
+    monkeypatch.setattr(
+        lemon, 'fragment_cache', cache.FragmentCache(cache.LRUCache()))
+
+    views = []
+    for title in ['A', 'A', 'B']:
+        nav = view.View('Nav')
+        nav.render(lemon=lemon, params=dict(title=title))
+        views.append(nav)
+
+    assert renders.count('Nav/Nav.nunjucks') == 2
+    assert views[1].html.find('A') > 0
+    assert views[1].html.find('<nav id="%s"' % views[1].element_id) == 0
+
+    link_ids = [nav.to_dict()['children'][0]['element_id'] for nav in views]
+    assert len(set(link_ids)) == 3
+    assert views[1].html.find(link_ids[1]) > 0
+    assert views[1].html.find(link_ids[0]) < 0
+
+    lemon.invalidate_view('Link')
+    view.View('Nav').render(lemon=lemon, params=dict(title='A'))
+    assert renders.count('Nav/Nav.nunjucks') == 3
+
+
+def test_fragment_cache_many_children(monkeypatch):
+    """The element ids of a cached view with more than ten descendants are
+    all replaced, and remain unique.
+    """
+
+    templates = {
+        'Wrap/Wrap.nunjucks': "{{ view('List') }}{{ view('Row') }}",
+        'List/List.nunjucks': (
+            "{{ describe('ul', cache=60) }}"
+            "{% for i in range(12) %}{{ view('Row') }}{% endfor %}"),
+        'Row/Row.nunjucks': 'Row'}
+    monkeypatch.setattr(
+        app.jinja_env, 'get_template',
+        lambda name: app.jinja_env.from_string(templates[name]))
+    monkeypatch.setattr(
+        lemon, 'fragment_cache', cache.FragmentCache(cache.LRUCache()))
+
+    for _ in range(2):
+        wrap = view.View('Wrap')
+        wrap.render(lemon=lemon, scope=scope.Scope())
+
+    rows = wrap.to_dict()['children'][0]['children']
+    ids = [row['element_id'] for row in rows]
+    assert len(rows) == 12
+    assert None not in ids
+    assert len(set(ids)) == 12
+    for element_id in ids:
+        assert wrap.html.count('id="%s"' % element_id) == 1
+
+
+def test_view_slots():
+    """Views have no dictionary, and share their template path and empty
+    values.
+    """
+
+    first = view.View('Table/Row')
+    second = view.View('Table/Row')
+
+    assert not hasattr(first, '__dict__')
+    assert not hasattr(view.MainView('App'), '__dict__')
+    assert first.template is second.template
+    assert first.element_id != second.element_id
+
+    first.add_child(second)
+    assert first.children == [second]
+    assert not second.children
+
+
+def test_contain_escape():
+    """The container escapes the attributes of the view.
+    """
+
+    my_view = view.View('Row')
+    my_view.describe(
+        'tr', classes=['a"b'], attrs={'data-name': '<Name>', 'data-x': 1})
+    my_view.element_id = 'row'
+    my_view.contain('<td></td>')
+
+    assert my_view.html == (
+        '<tr id="row" class="View a&#34;b Row" data-name="&lt;Name&gt;"  '
+        'data-x="1" ><td></td></tr>')
+
+
+def slow_get(*args, **kwargs):
+    time.sleep(0.5)
+    return 'response'
+
+
+def slow_get_within(context, timeout, **kwargs):
+    if timeout < 0.5:
+        time.sleep(timeout)
+        raise TimeoutError()
+    return slow_get()
+
+
+def slow_api(monkeypatch):
+    """The api takes 0.5s to answer, views rendered outside of the pool pass
+    it their deadline.
+    """
+
+    monkeypatch.setattr(lemon.api_handler, 'get', slow_get)
+    monkeypatch.setattr(
+        lemon.api_handler, 'get_within', slow_get_within, raising=False)
+
+
+def test_render_deadline(monkeypatch):
+    """Views missing the deadline of the request are degraded.
+    """
+
+    slow_api(monkeypatch)
+    request_scope = scope.Scope()
+    request_scope.deadline = time.monotonic() + 0.05
+
+    start = time.monotonic()
+    toolbar = view.View('Toolbar')
+    with app.test_request_context('/'):
+        toolbar.render(lemon=lemon, scope=request_scope)
+
+    assert time.monotonic() - start < 0.4
+    assert request_scope.degraded == ['Button']
+    assert toolbar.html.find('data-lemon-lazy') > -1
+    assert toolbar.to_dict()['children'][0]['degraded']
+
+
+def test_fetch_timeout_fallback(monkeypatch):
+    """Views render the fallback block of their template when their fetch
+    times out.
+    """
+
+    slow_api(monkeypatch)
+    with app.test_request_context('/'):
+        html = view.render_main_view(
+            lemon, 'Slow', fetch=dict(endpoint='/slow/', timeout=0.05))
+
+    assert html.find('Unavailable') > -1
+
+
+def test_degraded_not_cached(monkeypatch):
+    """Views with a degraded child are not stored in the fragment cache.
+    """
+
+    monkeypatch.setitem(app.config, 'LEMON_FETCH_TIMEOUT', 0.05)
+    slow_api(monkeypatch)
+    monkeypatch.setattr(
+        lemon, 'fragment_cache', cache.FragmentCache(cache.LRUCache()))
+    lemon.fragment_cache.declare('Toolbar', 60)
+
+    with app.test_request_context('/'):
+        toolbar = view.View('Toolbar')
+        toolbar.render(lemon=lemon, scope=scope.Scope())
+        assert toolbar.html.find('data-lemon-lazy') > -1
+
+        get = MagicMock(return_value='response')
+        monkeypatch.setattr(lemon.api_handler, 'get', get)
+        monkeypatch.setattr(lemon.api_handler, 'get_within', get)
+        toolbar = view.View('Toolbar')
+        toolbar.render(lemon=lemon, scope=scope.Scope())
+        assert toolbar.html.find('<button') > -1
+
+
+def test_render_deadline_async(monkeypatch):
+    """Views missing the deadline of the request are degraded (asyncio).
+    """
+
+    slow_api(monkeypatch)
+    request_scope = scope.Scope()
+    request_scope.deadline = time.monotonic() + 0.05
+
+    toolbar = view.View('Toolbar')
+    aio.run(toolbar.render_async(lemon=lemon, scope=request_scope))
+
+    assert request_scope.degraded == ['Button']
+    assert toolbar.html.find('data-lemon-lazy') > -1
+
+
+def test_static_view(monkeypatch):
+    """Static views are rendered once, their container gets a new element id
+    each time.
+    """
+
+    renders = []
+    render = view.View.template_context
+
+    def template_context(self, kwargs):
+        renders.append(self.path)
+        return render(self, kwargs)
+
+    monkeypatch.setattr(view.View, 'template_context', template_context)
+    monkeypatch.setattr(lemon, 'static_views', {})
+
+    views = []
+    for _ in range(3):
+        main_view = view.View('MainView')
+        main_view.render(lemon=lemon)
+        views.append(main_view)
+
+    assert renders == ['MainView']
+    assert len(set(v.element_id for v in views)) == 3
+    assert views[2].html.find('Hello World') > 0
+    assert views[2].html.find('id="%s"' % views[2].element_id) > 0
+
+    lemon.reload_views(['MainView/MainView.nunjucks'])
+    view.View('MainView').render(lemon=lemon)
+    assert renders == ['MainView', 'MainView']
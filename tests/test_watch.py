@@ -0,0 +1,63 @@
+from flask import Flask
+import os
+
+from lemon import Lemon
+from lemon import watch
+
+
+def write(directory, name, source):
+    path = directory.join(name).ensure()
+    path.write(source)
+    # The modification time has to change, whatever the resolution of the
+    # filesystem.
+    stat = os.stat(str(path))
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_reload_views(tmpdir):
+    """Without auto reload, templates are only reloaded by `reload_views`.
+    """
+
+    write(tmpdir, 'Nav/Nav.nunjucks', 'First')
+    write(tmpdir, 'Footer/Footer.nunjucks', 'Footer')
+
+    app = Flask(__name__)
+    app.config['LEMON_AUTO_RELOAD'] = False
+    lemon = Lemon(app, view_path=str(tmpdir))
+    env = app.jinja_env
+
+    assert env.get_template('Nav/Nav.nunjucks').render() == 'First'
+    footer = env.get_template('Footer/Footer.nunjucks')
+
+    write(tmpdir, 'Nav/Nav.nunjucks', 'Second')
+    assert env.get_template('Nav/Nav.nunjucks').render() == 'First'
+
+    generation = lemon.fragment_cache.generations.get('Nav', 0)
+    lemon.reload_views(['Nav/Nav.nunjucks'])
+
+    assert env.get_template('Nav/Nav.nunjucks').render() == 'Second'
+    assert env.get_template('Footer/Footer.nunjucks') is footer
+    assert lemon.fragment_cache.generations['Nav'] == generation + 1
+    lemon.shutdown()
+
+
+def test_watcher(tmpdir):
+    """The watcher reports the templates added, modified and removed.
+    """
+
+    write(tmpdir, 'Nav/Nav.nunjucks', 'Nav')
+    write(tmpdir, 'Footer/Footer.nunjucks', 'Footer')
+    changes = []
+    watcher = watch.Watcher(str(tmpdir), 1, changes.append)
+
+    assert watcher.check() == []
+
+    write(tmpdir, 'Nav/Nav.nunjucks', 'Navigation')
+    write(tmpdir, 'Header/Header.nunjucks', 'Header')
+    tmpdir.join('Footer/Footer.nunjucks').remove()
+
+    assert watcher.check() == [
+        'Footer/Footer.nunjucks', 'Header/Header.nunjucks',
+        'Nav/Nav.nunjucks']
+    assert len(changes) == 1
+    assert watch.view_path('Parent/Child/Child.nunjucks') == 'Parent/Child'